@@ -1,7 +1,12 @@
 import functools
+import threading
 import time
 
 
+# Separates positional from keyword arguments in memoize keys
+KEYWORD_MARK = object()
+
+
 class Cacheable(object):
     """Local memeory cache which periodically refresh the data by executing
     given generating function. Note that this cache isn't shared across
@@ -61,77 +66,6 @@ def cached(timeout):
     return decorator
 
 
-# memoized is similar to cached but timeout is none
-memoized = functools.partial(cached, timeout=None)
-
-def memoize(maxsize=None, Cache=LRUCache):
-
-    def _memoize(fun):
-        mutex = threading.Lock()
-        cache = Cache(limit=maxsize)
-
-        @wraps(fun)
-        def _M(*args, **kwargs):
-            key = args + (KEYWORD_MARK,) + tuple(sorted(kwargs.items()))
-            try:
-                with mutex:
-                    value = cache[key]
-            except KeyError:
-                value = fun(*args, **kwargs)
-                _M.misses += 1
-                with mutex:
-                    cache[key] = value
-            else:
-                _M.hits += 1
-            return value
-
-        def clear():
-            """Clear the cache and reset cache statistics."""
-            cache.clear()
-            _M.hits = _M.misses = 0
-
-        _M.hits = _M.misses = 0
-        _M.clear = clear
-        _M.original_func = fun
-        return _M
-
-    return _memoize
-
-
-def memoize(maxsize=None, keyfun=None, Cache=LRUCache):
-
-    def _memoize(fun):
-        cache = Cache(limit=maxsize)
-
-        @wraps(fun)
-        def _M(*args, **kwargs):
-            if keyfun:
-                key = keyfun(args, kwargs)
-            else:
-                key = args + (KEYWORD_MARK,) + tuple(sorted(kwargs.items()))
-            try:
-                value = cache[key]
-            except KeyError:
-                value = fun(*args, **kwargs)
-                _M.misses += 1
-                cache[key] = value
-            else:
-                _M.hits += 1
-            return value
-
-        def clear():
-            """Clear the cache and reset cache statistics."""
-            cache.clear()
-            _M.hits = _M.misses = 0
-
-        _M.hits = _M.misses = 0
-        _M.clear = clear
-        _M.original_func = fun
-        return _M
-
-    return _memoize
-
-
 class LRUCache(dict):
     """A dictionary-like object that stores only a certain number of items, and
     discards its least recently used item when full.
@@ -180,6 +114,7 @@ class LRUCache(dict):
             return repr(self.value)
 
     def __init__(self, capacity):
+        # A capacity of None never discards anything
         self._dict = dict()
         self.capacity = capacity
         self.head = None
@@ -226,7 +161,13 @@ class LRUCache(dict):
         self.head = item
         self._manage_size()
 
+    def clear(self):
+        self._dict.clear()
+        self.head = self.tail = None
+
     def _manage_size(self):
+        if self.capacity is None:
+            return
         while len(self._dict) > self.capacity:
             del self._dict[self.tail.key]
             if self.tail != self.head:
@@ -251,3 +192,46 @@ class LRUCache(dict):
         self.head.previous = self.head = item
 
 
+# memoized is similar to cached but timeout is none
+memoized = functools.partial(cached, timeout=None)
+
+
+def memoize(maxsize=None, keyfun=None, Cache=LRUCache):
+    """Thread-safe memoizing decorator keeping at most `maxsize` results, or
+    all of them when `maxsize` is None. `keyfun(args, kwargs)` may override
+    the cache key."""
+
+    def _memoize(fun):
+        mutex = threading.Lock()
+        cache = Cache(maxsize)
+
+        @functools.wraps(fun)
+        def _M(*args, **kwargs):
+            if keyfun:
+                key = keyfun(args, kwargs)
+            else:
+                key = args + (KEYWORD_MARK,) + tuple(sorted(kwargs.items()))
+            try:
+                with mutex:
+                    value = cache[key]
+            except KeyError:
+                value = fun(*args, **kwargs)
+                _M.misses += 1
+                with mutex:
+                    cache[key] = value
+            else:
+                _M.hits += 1
+            return value
+
+        def clear():
+            """Clear the cache and reset cache statistics."""
+            with mutex:
+                cache.clear()
+            _M.hits = _M.misses = 0
+
+        _M.hits = _M.misses = 0
+        _M.clear = clear
+        _M.original_func = fun
+        return _M
+
+    return _memoize
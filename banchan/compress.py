@@ -1,3 +1,26 @@
+import bz2
+import functools
+import multiprocessing
+import struct
+import sys
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
 class GzipDecompressor(object):
     """Streaming gzip decompressor.
 
@@ -21,7 +44,7 @@ class GzipDecompressor(object):
         in ``unconsumed_tail``; you must retrieve this value and pass
         it back to a future call to `decompress` if it is not empty.
         """
-        return self.decompressobj.decompress(value, max_length)
+        return self.decompressobj.decompress(value, max_length or 0)
 
     @property
     def unconsumed_tail(self):
@@ -29,6 +52,18 @@ class GzipDecompressor(object):
         """
         return self.decompressobj.unconsumed_tail
 
+    @property
+    def unused_data(self):
+        """Returns the data found after the end of the gzip member
+        """
+        return self.decompressobj.unused_data
+
+    @property
+    def eof(self):
+        """Whether the end of the gzip member has been reached
+        """
+        return self.decompressobj.eof
+
     def flush(self):
         """Return any remaining buffered data not yet returned by decompress.
 
@@ -36,3 +71,235 @@ class GzipDecompressor(object):
         No other methods may be called on this object after `flush`.
         """
         return self.decompressobj.flush()
+
+
+class DecompressionLimitError(ValueError):
+    """Raised by `decompress_stream` when the output exceeds its limits,
+    e.g. for a decompression bomb."""
+
+
+_decompressors = {
+    'gzip': GzipDecompressor,
+    'zlib': zlib.decompressobj,
+    'deflate': lambda: zlib.decompressobj(-zlib.MAX_WBITS),
+    'bz2': bz2.BZ2Decompressor,
+}
+if lzma is not None:
+    _decompressors['lzma'] = lzma.LZMADecompressor
+
+
+def decompress_stream(source, codec='gzip', chunk_size=65536, max_size=None,
+                      max_ratio=None, read_size=65536):
+    """Decompress a file-like object or an iterable of byte strings in
+    constant memory, yielding chunks of at most ``chunk_size`` bytes.
+
+    ``codec`` is one of ``gzip``, ``zlib``, ``deflate`` (raw), ``bz2`` and
+    ``lzma`` (needs the lzma module); concatenated streams, like multi-member
+    gzip files, are read one after another, and zero padding after a gzip
+    member is skipped as `gzip.decompress` does. `DecompressionLimitError`
+    is raised as soon as the output exceeds ``max_size`` bytes or
+    ``max_ratio`` times the input read so far, and `EOFError` if the input
+    ends in the middle of a stream.
+    """
+    if codec == 'lzma' and lzma is None:
+        raise ValueError('lzma is required for the lzma codec')
+    factory = _decompressors[codec]
+    if hasattr(source, 'read'):
+        source = iter(functools.partial(source.read, read_size), b'')
+    decompressor = factory()
+    # zlib keeps input it couldn't process yet in unconsumed_tail, bz2 and
+    # lzma buffer it internally
+    has_tail = hasattr(decompressor, 'unconsumed_tail')
+    started = False
+    # Set after a gzip member, which may be followed by NUL padding
+    skip_padding = False
+    total_in = total_out = 0
+
+    for data in source:
+        total_in += len(data)
+        while data or started:
+            if skip_padding:
+                data = data.lstrip(b'\x00')
+                if not data:
+                    break
+                skip_padding = False
+            if decompressor.eof:
+                decompressor = factory()
+            started = True
+            output = decompressor.decompress(data, chunk_size)
+            data = decompressor.unconsumed_tail if has_tail else b''
+            if output:
+                total_out += len(output)
+                if max_size is not None and total_out > max_size:
+                    raise DecompressionLimitError(
+                        'Decompressed data exceeds {0} bytes'.format(
+                            max_size))
+                if (max_ratio is not None and total_out > chunk_size and
+                        total_out > max_ratio * total_in):
+                    raise DecompressionLimitError(
+                        'Compression ratio exceeds {0}'.format(max_ratio))
+                yield output
+            if decompressor.eof:
+                # Anything left is the start of the next stream
+                data = decompressor.unused_data
+                started = False
+                skip_padding = codec == 'gzip'
+            elif not data and len(output) < chunk_size:
+                break
+    if started and not decompressor.eof:
+        raise EOFError('Compressed data ended before the end of the stream')
+
+
+# Marker to put in a stream passed to `compress_stream` to flush the output
+# compressed so far, e.g. before waiting on something slow.
+FLUSH = object()
+
+
+class StreamCompressor(object):
+    """Incremental compressor for the HTTP content codings ``gzip``,
+    ``deflate``, ``br`` (needs brotli) and ``zstd`` (needs zstandard).
+
+    Output is coalesced: `compress` returns nothing until at least
+    ``min_size`` compressed bytes are pending, so many small writes don't
+    turn into many tiny chunks. `flush` returns everything pending,
+    decodable by the client up to that point, and `finish` ends the stream.
+    """
+    default_levels = {'gzip': 6, 'deflate': 6, 'br': 5, 'zstd': 3}
+
+    def __init__(self, codec='gzip', level=None, min_size=16384):
+        if codec not in self.default_levels:
+            raise ValueError('Unknown codec: {0}'.format(codec))
+        if level is None:
+            level = self.default_levels[codec]
+        self.codec = codec
+        self.level = level
+        self.min_size = min_size
+        self._pending = []
+        self._pending_size = 0
+
+        if codec in ('gzip', 'deflate'):
+            # Magic parameter makes zlib write a gzip header and trailer
+            wbits = 16 + zlib.MAX_WBITS if codec == 'gzip' else zlib.MAX_WBITS
+            obj = zlib.compressobj(level, zlib.DEFLATED, wbits)
+            self._compress = obj.compress
+            self._flush = lambda: obj.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = obj.flush
+        elif codec == 'br':
+            if brotli is None:
+                raise ValueError('brotli is required for the br codec')
+            obj = brotli.Compressor(quality=level)
+            self._compress = obj.process
+            self._flush = obj.flush
+            self._finish = obj.finish
+        else:
+            if zstandard is None:
+                raise ValueError('zstandard is required for the zstd codec')
+            obj = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress = obj.compress
+            self._flush = lambda: obj.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self._finish = obj.flush
+
+    def _take(self, data):
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+        data = b''.join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        return data
+
+    def compress(self, data):
+        """Compress a chunk, returning coalesced output or ``b''``."""
+        data = self._compress(data)
+        if not data:
+            return b''
+        if self._pending_size + len(data) < self.min_size:
+            self._pending.append(data)
+            self._pending_size += len(data)
+            return b''
+        return self._take(data)
+
+    def flush(self):
+        """Return all output pending so far."""
+        return self._take(self._flush())
+
+    def finish(self):
+        """End the stream, returning the remaining output."""
+        return self._take(self._finish())
+
+
+def compress_stream(iterable, codec='gzip', level=None, min_size=16384):
+    """Compress an iterable of byte strings, yielding chunks of at least
+    ``min_size`` bytes except at a `FLUSH` marker and at the end."""
+    compressor = StreamCompressor(codec, level, min_size)
+    for item in iterable:
+        data = compressor.flush() if item is FLUSH else \
+            compressor.compress(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def _deflate_block(block, level, dictionary, last):
+    if dictionary:
+        obj = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                               zlib.DEF_MEM_LEVEL, zlib.Z_DEFAULT_STRATEGY,
+                               dictionary)
+    else:
+        obj = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    # A sync flush ends the block on a byte boundary, so the raw deflate
+    # streams of consecutive blocks can simply be concatenated
+    return obj.compress(block) + obj.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def compress_blocks_parallel(blocks, level=6, workers=None):
+    """Gzip-compress an iterable of byte blocks on several threads, pigz
+    style, yielding the output of one gzip member as it's ready.
+
+    Each block is deflated on its own, primed with the last 32 KB of the
+    previous block as dictionary so the ratio stays close to that of a
+    single stream; zlib releases the GIL while compressing. At most two
+    blocks per worker are in flight, so memory stays bounded for streams.
+    Needs `concurrent.futures` (the futures backport on Python 2).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    workers = workers or multiprocessing.cpu_count()
+    yield struct.pack('<4sIBB', b'\x1f\x8b\x08\x00', 0, 0, 255)
+    crc = size = 0
+    previous = b''
+    futures = []
+    with ThreadPoolExecutor(workers) as executor:
+        blocks = iter(blocks)
+        block = next(blocks, None)
+        if block is None:
+            # An empty deflate stream is a single final empty block
+            yield b'\x03\x00'
+        while block is not None:
+            following = next(blocks, None)
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+            futures.append(executor.submit(
+                _deflate_block, block, level, previous[-32768:],
+                following is None))
+            previous, block = block, following
+            if len(futures) >= 2 * workers:
+                yield futures.pop(0).result()
+        for future in futures:
+            yield future.result()
+    yield struct.pack('<II', crc & 0xffffffff, size & 0xffffffff)
+
+
+def compress_parallel(data, level=6, block_size=1 << 20, workers=None):
+    """Gzip-compress bytes using several threads; the result is one
+    ordinary gzip member. See `compress_blocks_parallel`."""
+    view = memoryview(data)
+    blocks = (view[i:i + block_size]
+              for i in range(0, len(view), block_size))
+    return b''.join(compress_blocks_parallel(blocks, level, workers))
+
+
+if sys.version_info[0] >= 3:
+    from .compress_async import acompress_stream  # noqa
@@ -0,0 +1,17 @@
+from .compress import FLUSH, StreamCompressor
+
+
+async def acompress_stream(iterable, codec='gzip', level=None,
+                           min_size=16384):
+    """Asynchronous version of `compress.compress_stream` for async
+    iterables, e.g. streaming HTTP response bodies.
+
+    Only available on Python 3: ``async def`` is a syntax error on Python 2.
+    """
+    compressor = StreamCompressor(codec, level, min_size)
+    async for item in iterable:
+        data = compressor.flush() if item is FLUSH else \
+            compressor.compress(item)
+        if data:
+            yield data
+    yield compressor.finish()
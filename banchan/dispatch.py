@@ -1,5 +1,7 @@
+import concurrent.futures
 import sys
 import threading
+import timeit
 import warnings
 import weakref
 
@@ -8,10 +10,14 @@ from django.utils.deprecation import RemovedInDjango20Warning
 from django.utils.inspect import func_accepts_kwargs
 from django.utils.six.moves import range
 
+from .latency import LatencyRecorder
+
 if six.PY2:
     from .weakref_backports import WeakMethod
+    AsyncSignalMixin = object
 else:
     from weakref import WeakMethod
+    from .dispatch_async import AsyncSignalMixin
 
 
 def _make_id(target):
@@ -20,39 +26,80 @@ def _make_id(target):
     return id(target)
 NONE_ID = _make_id(None)
 
-# A marker for caching
+# A marker for caching. No longer used by Signal, whose receivers are
+# resolved per sender ahead of time; kept for code importing it.
 NO_RECEIVERS = object()
 
 
-class Signal(object):
+class ReceiverTimeoutError(concurrent.futures.TimeoutError):
+    """
+    Returned by send_robust() in place of the response of a receiver that
+    did not finish within the signal's timeout.
+    """
+    def __init__(self, receiver, timeout):
+        super(ReceiverTimeoutError, self).__init__(
+            '%r did not respond within %ss' % (receiver, timeout))
+        self.receiver = receiver
+        self.timeout = timeout
+
+
+def _strong_ref(receiver):
+    # Lets strong receivers be "dereferenced" by a call, like weakrefs
+    return lambda: receiver
+
+
+class Signal(AsyncSignalMixin):
     """
     Base class for all signals
 
     Internal attributes:
 
         receivers
-            { receiverkey (id) : weakref(receiver) }
+            [ ((receiverkey (id), senderkey (id)), weakref(receiver)) ]
+
+        _snapshot
+            (any-sender refs, { senderkey (id) : refs }), rebuilt by
+            connect() and disconnect() and replaced in a single assignment,
+            so send() can read it without taking the lock. Every ref is
+            called to get the receiver, strong receivers are wrapped so
+            that this works for them too.
     """
-    def __init__(self, providing_args=None, use_caching=False):
+    def __init__(self, providing_args=None, use_caching=False,
+                 max_workers=None, timeout=None):
         """
         Create a new signal.
 
         providing_args
             A list of the arguments this signal can pass along in a send() call.
+
+        max_workers
+            If given, send_robust() runs receivers in parallel on a thread pool
+            of this size, created on first use and owned by the signal until
+            close() is called.
+
+        timeout
+            Seconds send_robust() waits for each receiver, counted from when
+            it starts running. Receivers still running after that are
+            reported with a ReceiverTimeoutError instead of their response.
+            Setting it makes send_robust() always run receivers on the thread
+            pool, even a single one, since that is the only way to stop
+            waiting for them.
         """
         self.receivers = []
         if providing_args is None:
             providing_args = []
         self.providing_args = set(providing_args)
         self.lock = threading.Lock()
+        # Receivers are always resolved per sender ahead of time now, so
+        # use_caching no longer changes anything. It is kept for
+        # compatibility.
         self.use_caching = use_caching
-        # For convenience we create empty caches even if they are not used.
-        # A note about caching: if use_caching is defined, then for each
-        # distinct sender we cache the receivers that sender has in
-        # 'sender_receivers_cache'. The cache is cleaned when .connect() or
-        # .disconnect() is called and populated on send().
-        self.sender_receivers_cache = weakref.WeakKeyDictionary() if use_caching else {}
+        self._snapshot = ((), {})
         self._dead_receivers = False
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = None
+        self.recorder = None
 
     def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
         """
@@ -114,15 +161,21 @@ class Signal(object):
                 weakref.finalize(receiver_object, self._remove_receiver)
             else:
                 receiver = ref(receiver, self._remove_receiver)
+        else:
+            receiver = _strong_ref(receiver)
 
         with self.lock:
-            self._clear_dead_receivers()
+            cleared = self._clear_dead_receivers()
             for r_key, _ in self.receivers:
                 if r_key == lookup_key:
                     break
             else:
                 self.receivers.append((lookup_key, receiver))
-            self.sender_receivers_cache.clear()
+                if not cleared:
+                    self._publish_added(lookup_key[1], receiver)
+                    return
+            if cleared:
+                self._publish()
 
     def disconnect(self, receiver=None, sender=None, weak=None, dispatch_uid=None):
         """
@@ -153,16 +206,39 @@ class Signal(object):
 
         disconnected = False
         with self.lock:
-            self._clear_dead_receivers()
+            cleared = self._clear_dead_receivers()
             for index in range(len(self.receivers)):
                 (r_key, _) = self.receivers[index]
                 if r_key == lookup_key:
                     disconnected = True
                     del self.receivers[index]
                     break
-            self.sender_receivers_cache.clear()
+            self._publish(None if cleared else lookup_key[1])
         return disconnected
 
+    def instrument(self, recorder=None):
+        """
+        Start recording how long each receiver takes in send(), send_many(),
+        send_robust() and, on Python 3, asend() and asend_robust().
+
+        recorder
+            An object with ``call(receiver, *args, **kwargs)`` and
+            ``record(receiver, elapsed)`` methods and a ``timer``, like
+            latency.LatencyRecorder, which is created when omitted. The same
+            recorder may be shared between signals and emitters.
+
+        Returns the recorder, whose report() shows the collected numbers.
+        Pass it to uninstrument() or set ``recorder`` to None to stop; a
+        signal without a recorder only pays one attribute lookup per send.
+        """
+        if recorder is None:
+            recorder = LatencyRecorder()
+        self.recorder = recorder
+        return recorder
+
+    def uninstrument(self):
+        self.recorder = None
+
     def has_listeners(self, sender=None):
         return bool(self._live_receivers(sender))
 
@@ -185,14 +261,75 @@ class Signal(object):
         Returns a list of tuple pairs [(receiver, response), ... ].
         """
         responses = []
-        if not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
-            return responses
+        recorder = self.recorder
+        for ref in self._receivers_for(sender):
+            receiver = ref()
+            if receiver is None:
+                continue
+            if recorder is None:
+                response = receiver(signal=self, sender=sender, **named)
+            else:
+                response = recorder.call(
+                    receiver, signal=self, sender=sender, **named)
+            responses.append((receiver, response))
+        return responses
+
+    def send_many(self, sender, payloads):
+        """
+        Send signal from sender once for every payload in payloads.
+
+        Receivers are resolved a single time for the whole batch. Receivers
+        marked with @batch_receiver are called once with the complete list as
+        ``payloads``; every other receiver is called once per payload with the
+        payload's items as named arguments, just as send() would.
+
+        Unlike a loop over send(), each receiver handles all payloads before
+        the next receiver is called. Errors propagate like in send().
 
+        Arguments:
+
+            sender
+                The sender of the signal Either a specific object or None.
+
+            payloads
+                A sequence of dicts of named arguments.
+
+        Returns a list of tuple pairs [(receiver, response), ... ], where the
+        response is what a batch receiver returned, or the list of responses
+        of a plain receiver, one per payload.
+        """
+        payloads = list(payloads)
+        responses = []
+        if not payloads:
+            return responses
+        recorder = self.recorder
+        call = None if recorder is None else recorder.call
         for receiver in self._live_receivers(sender):
-            response = receiver(signal=self, sender=sender, **named)
+            if getattr(receiver, 'accepts_batch', False):
+                if call is None:
+                    response = receiver(
+                        signal=self, sender=sender, payloads=payloads)
+                else:
+                    response = call(receiver, signal=self, sender=sender,
+                                    payloads=payloads)
+            elif call is None:
+                response = [receiver(signal=self, sender=sender, **named)
+                            for named in payloads]
+            else:
+                response = [call(receiver, signal=self, sender=sender, **named)
+                            for named in payloads]
             responses.append((receiver, response))
         return responses
 
+    def buffer(self, sender, max_size=100, max_delay=None):
+        """
+        Return a SignalBuffer coalescing sends from sender into send_many()
+        calls of up to max_size payloads, flushed at most max_delay seconds
+        after the first buffered one.
+        """
+        return SignalBuffer(self, sender, max_size=max_size,
+                            max_delay=max_delay)
+
     def send_robust(self, sender, **named):
         """
         Send signal from sender to all connected receivers catching errors.
@@ -216,16 +353,35 @@ class Signal(object):
         Exception), the error instance is returned as the result for that
         receiver. The traceback is always attached to the error at
         ``__traceback__``.
+
+        If the signal was created with a timeout, or with max_workers and
+        more than one receiver is connected, receivers are submitted to its
+        thread pool at once, and each is waited for at most ``timeout``
+        seconds from when it starts running, so time spent queued for a free
+        worker doesn't count. Receivers that have not finished by then get a
+        ReceiverTimeoutError as their result. They can't be interrupted, so
+        if no receiver of the call is running any more, for instance because
+        the workers are held by ones that timed out, those still queued get
+        ``timeout`` seconds to start before they are cancelled and reported
+        the same way.
         """
+        receivers = self._live_receivers(sender)
+        if receivers and (self.timeout is not None or
+                          self.max_workers and len(receivers) > 1):
+            return self._send_robust_parallel(receivers, sender, named)
+
         responses = []
-        if not self.receivers or self.sender_receivers_cache.get(sender) is NO_RECEIVERS:
-            return responses
+        recorder = self.recorder
 
         # Call each receiver with whatever arguments it can accept.
         # Return a list of tuple pairs [(receiver, response), ... ].
-        for receiver in self._live_receivers(sender):
+        for receiver in receivers:
             try:
-                response = receiver(signal=self, sender=sender, **named)
+                if recorder is None:
+                    response = receiver(signal=self, sender=sender, **named)
+                else:
+                    response = recorder.call(
+                        receiver, signal=self, sender=sender, **named)
             except Exception as err:
                 if not hasattr(err, '__traceback__'):
                     err.__traceback__ = sys.exc_info()[2]
@@ -234,8 +390,114 @@ class Signal(object):
                 responses.append((receiver, response))
         return responses
 
+    def close(self):
+        """
+        Shut down the thread pool used by send_robust(), without waiting for
+        receivers still running on it. A later send_robust() starts a new
+        one, but close() must not be called while one is in progress.
+        """
+        with self.lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self.lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.max_workers)
+        return self._executor
+
+    def _send_robust_parallel(self, receivers, sender, named):
+        executor = self._get_executor()
+        recorder = self.recorder
+        # When each receiver started running, to time it out from then
+        started = [None] * len(receivers)
+        condition = threading.Condition()
+
+        def call(index, receiver):
+            with condition:
+                started[index] = timeit.default_timer()
+                condition.notify()
+            if recorder is None:
+                return receiver(signal=self, sender=sender, **named)
+            return recorder.call(receiver, signal=self, sender=sender, **named)
+
+        def notify(future):
+            with condition:
+                condition.notify()
+
+        futures = []
+        for index, receiver in enumerate(receivers):
+            future = executor.submit(call, index, receiver)
+            future.add_done_callback(notify)
+            futures.append(future)
+        if self.timeout is None:
+            concurrent.futures.wait(futures)
+            timed_out = ()
+        else:
+            timed_out = self._wait_for_receivers(futures, started, condition)
+
+        responses = []
+        for index, (receiver, future) in enumerate(zip(receivers, futures)):
+            if index in timed_out:
+                future.cancel()
+                responses.append(
+                    (receiver, ReceiverTimeoutError(receiver, self.timeout)))
+                continue
+            err = future.exception()
+            if err is None:
+                responses.append((receiver, future.result()))
+            elif isinstance(err, Exception):
+                responses.append((receiver, err))
+            else:
+                raise err
+        return responses
+
+    def _wait_for_receivers(self, futures, started, condition):
+        """
+        Wait until every future is done or timed out, and return the indices
+        of those that timed out. Receivers notify condition when they start
+        and when they finish.
+        """
+        timeout = self.timeout
+        timed_out = set()
+        stalled_since = None
+        with condition:
+            while True:
+                now = timeit.default_timer()
+                wait = None
+                queued = []
+                for index, future in enumerate(futures):
+                    if index in timed_out or future.done():
+                        continue
+                    if started[index] is None:
+                        queued.append(index)
+                        continue
+                    remaining = started[index] + timeout - now
+                    if remaining <= 0:
+                        timed_out.add(index)
+                    elif wait is None or remaining < wait:
+                        wait = remaining
+                if wait is None:
+                    if not queued:
+                        return timed_out
+                    # Nothing of ours is running, so nothing we wait for
+                    # frees a worker: give the queued ones timeout to start
+                    if stalled_since is None:
+                        stalled_since = now
+                    wait = stalled_since + timeout - now
+                    if wait <= 0:
+                        timed_out.update(queued)
+                        return timed_out
+                else:
+                    stalled_since = None
+                condition.wait(wait)
+
     def _clear_dead_receivers(self):
-        # Note: caller is assumed to hold self.lock.
+        # Note: caller is assumed to hold self.lock. Returns whether any
+        # receiver was removed.
         if self._dead_receivers:
             self._dead_receivers = False
             new_receivers = []
@@ -243,7 +505,80 @@ class Signal(object):
                 if isinstance(r[1], weakref.ReferenceType) and r[1]() is None:
                     continue
                 new_receivers.append(r)
+            removed = len(new_receivers) != len(self.receivers)
             self.receivers = new_receivers
+            return removed
+        return False
+
+    def _publish(self, senderkey=None):
+        """
+        Rebuild the per-sender receiver tuples read by send().
+
+        Note: caller is assumed to hold self.lock. Receivers for any sender
+        are merged into every sender specific tuple in connection order, so
+        send() only has to do a single lookup. If only the receivers of
+        senderkey changed, only its tuple is rebuilt; otherwise everything
+        is, in one pass over self.receivers.
+        """
+        any_sender, by_sender = self._snapshot
+        if senderkey is not None and senderkey != NONE_ID:
+            refs = tuple(
+                receiver
+                for (receiverkey, r_senderkey), receiver in self.receivers
+                if r_senderkey == NONE_ID or r_senderkey == senderkey)
+            by_sender = dict(by_sender)
+            if len(refs) > len(any_sender):
+                by_sender[senderkey] = refs
+            else:
+                by_sender.pop(senderkey, None)
+            self._snapshot = (any_sender, by_sender)
+            return
+
+        any_sender = []
+        by_sender = {}
+        for (receiverkey, r_senderkey), receiver in self.receivers:
+            if r_senderkey == NONE_ID:
+                any_sender.append(receiver)
+                for refs in by_sender.values():
+                    refs.append(receiver)
+            else:
+                refs = by_sender.get(r_senderkey)
+                if refs is None:
+                    refs = by_sender[r_senderkey] = list(any_sender)
+                refs.append(receiver)
+        self._snapshot = (tuple(any_sender), dict(
+            (key, tuple(refs)) for key, refs in by_sender.items()))
+
+    def _publish_added(self, senderkey, receiver):
+        """
+        Publish receiver, just appended to self.receivers for senderkey,
+        by extending the tuples it belongs in instead of rebuilding them.
+
+        Note: caller is assumed to hold self.lock.
+        """
+        any_sender, by_sender = self._snapshot
+        by_sender = dict(by_sender)
+        if senderkey == NONE_ID:
+            any_sender += (receiver,)
+            for key, refs in by_sender.items():
+                by_sender[key] = refs + (receiver,)
+        else:
+            by_sender[senderkey] = \
+                by_sender.get(senderkey, any_sender) + (receiver,)
+        self._snapshot = (any_sender, by_sender)
+
+    def _receivers_for(self, sender):
+        """
+        Return the published tuple of receiver refs for sender.
+
+        Lock free: the snapshot is immutable and swapped in one assignment.
+        Dead weak references may still be in it until the next connect()
+        or disconnect(), calling them returns None.
+        """
+        any_sender, by_sender = self._snapshot
+        if not by_sender:
+            return any_sender
+        return by_sender.get(_make_id(sender), any_sender)
 
     def _live_receivers(self, sender):
         """
@@ -252,43 +587,18 @@ class Signal(object):
         This checks for weak references and resolves them, then returning only
         live receivers.
         """
-        receivers = None
-        if self.use_caching and not self._dead_receivers:
-            receivers = self.sender_receivers_cache.get(sender)
-            # We could end up here with NO_RECEIVERS even if we do check this case in
-            # .send() prior to calling _live_receivers() due to concurrent .send() call.
-            if receivers is NO_RECEIVERS:
-                return []
-        if receivers is None:
-            with self.lock:
-                self._clear_dead_receivers()
-                senderkey = _make_id(sender)
-                receivers = []
-                for (receiverkey, r_senderkey), receiver in self.receivers:
-                    if r_senderkey == NONE_ID or r_senderkey == senderkey:
-                        receivers.append(receiver)
-                if self.use_caching:
-                    if not receivers:
-                        self.sender_receivers_cache[sender] = NO_RECEIVERS
-                    else:
-                        # Note, we must cache the weakref versions.
-                        self.sender_receivers_cache[sender] = receivers
-        non_weak_receivers = []
-        for receiver in receivers:
-            if isinstance(receiver, weakref.ReferenceType):
-                # Dereference the weak reference.
-                receiver = receiver()
-                if receiver is not None:
-                    non_weak_receivers.append(receiver)
-            else:
-                non_weak_receivers.append(receiver)
-        return non_weak_receivers
+        receivers = []
+        for ref in self._receivers_for(sender):
+            receiver = ref()
+            if receiver is not None:
+                receivers.append(receiver)
+        return receivers
 
     def _remove_receiver(self, receiver=None):
         # Mark that the self.receivers list has dead weakrefs. If so, we will
-        # clean those up in connect, disconnect and _live_receivers while
-        # holding self.lock. Note that doing the cleanup here isn't a good
-        # idea, _remove_receiver() will be called as side effect of garbage
+        # clean those up in connect and disconnect while holding self.lock.
+        # Note that doing the cleanup here isn't a good idea,
+        # _remove_receiver() will be called as side effect of garbage
         # collection, and so the call can happen while we are already holding
         # self.lock.
         self._dead_receivers = True
@@ -316,3 +626,81 @@ def receiver(signal, **kwargs):
         return func
     return _decorator
 
+
+def batch_receiver(func):
+    """
+    Mark func to receive Signal.send_many() batches as a single call with a
+    ``payloads`` list instead of one call per payload::
+
+        @receiver(post_save)
+        @batch_receiver
+        def index(sender, payloads, **kwargs):
+            search.bulk_index([p['instance'] for p in payloads])
+    """
+    func.accepts_batch = True
+    return func
+
+
+class SignalBuffer(object):
+    """
+    Coalesces sends of a signal into batched Signal.send_many() calls.
+
+    Payloads given to send() are buffered and delivered once max_size of them
+    are waiting, when max_delay seconds have passed since the first one
+    (on a timer thread, so receivers may run there), or on flush(). Leaving
+    a ``with`` block flushes as well::
+
+        with post_save.buffer(sender=MyModel, max_size=500) as buffered:
+            for instance in instances:
+                buffered.send(instance=instance)
+    """
+    def __init__(self, signal, sender, max_size=100, max_delay=None):
+        self.signal = signal
+        self.sender = sender
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self._payloads = []
+        self._timer = None
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def send(self, **named):
+        """
+        Buffer one payload. Returns the send_many() responses if this filled
+        the buffer, else None.
+        """
+        with self.lock:
+            self._payloads.append(named)
+            if len(self._payloads) < self.max_size:
+                if self.max_delay is not None and self._timer is None:
+                    self._timer = threading.Timer(self.max_delay, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return None
+            payloads = self._take()
+        return self.signal.send_many(self.sender, payloads)
+
+    def flush(self):
+        """
+        Deliver everything buffered so far. Returns the send_many()
+        responses.
+        """
+        with self.lock:
+            payloads = self._take()
+        return self.signal.send_many(self.sender, payloads)
+
+    def _take(self):
+        # Note: caller is assumed to hold self.lock.
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        payloads, self._payloads = self._payloads, []
+        return payloads
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
@@ -0,0 +1,95 @@
+import asyncio
+import functools
+import inspect
+
+
+class AsyncSignalMixin(object):
+    """
+    The coroutine half of dispatch.Signal, which it inherits from on
+    Python 3 only: ``async def`` is a syntax error on Python 2.
+    """
+
+    async def asend(self, sender, executor=None, **named):
+        """
+        Send signal from sender to all connected receivers concurrently.
+
+        Coroutine receivers are awaited together with asyncio.gather(), so
+        the whole dispatch takes as long as the slowest receiver rather than
+        the sum of all of them. Plain receivers are called inline on the event
+        loop, or in executor when one is given. A plain receiver returning an
+        awaitable has it awaited too.
+
+        As with send(), an error raised by a receiver propagates back through
+        asend(). The other receivers are not cancelled.
+
+        Arguments:
+
+            sender
+                The sender of the signal Either a specific object or None.
+
+            executor
+                A concurrent.futures.Executor to run plain receivers in, or
+                None to call them on the event loop.
+
+            named
+                Named arguments which will be passed to receivers.
+
+        Returns a list of tuple pairs [(receiver, response), ... ] in the same
+        order as send().
+        """
+        receivers = self._live_receivers(sender)
+        if not receivers:
+            return []
+        responses = await asyncio.gather(*[
+            self._acall(receiver, executor, sender, named)
+            for receiver in receivers])
+        return list(zip(receivers, responses))
+
+    async def asend_robust(self, sender, executor=None, **named):
+        """
+        Send signal from sender to all connected receivers concurrently,
+        catching errors.
+
+        Works like asend(), but if any receiver raises an error (specifically
+        any subclass of Exception), the error instance is returned as the
+        result for that receiver, like send_robust() does.
+
+        Returns a list of tuple pairs [(receiver, response), ... ].
+        """
+        receivers = self._live_receivers(sender)
+        if not receivers:
+            return []
+        responses = await asyncio.gather(*[
+            self._acall_robust(receiver, executor, sender, named)
+            for receiver in receivers])
+        return list(zip(receivers, responses))
+
+    async def _acall(self, receiver, executor, sender, named):
+        recorder = self.recorder
+        if executor is not None and not inspect.iscoroutinefunction(receiver):
+            # Recorded in the executor, so queueing for a worker isn't counted
+            if recorder is None:
+                call = functools.partial(
+                    receiver, signal=self, sender=sender, **named)
+            else:
+                call = functools.partial(
+                    recorder.call, receiver, signal=self, sender=sender,
+                    **named)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, call)
+        if recorder is not None:
+            start = recorder.timer()
+        try:
+            response = receiver(signal=self, sender=sender, **named)
+            if inspect.isawaitable(response):
+                response = await response
+            return response
+        finally:
+            if recorder is not None:
+                recorder.record(receiver, recorder.timer() - start)
+
+    async def _acall_robust(self, receiver, executor, sender, named):
+        try:
+            return await self._acall(receiver, executor, sender, named)
+        except Exception as err:
+            return err
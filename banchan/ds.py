@@ -1,13 +1,27 @@
 from collections import defaultdict
+from copy import deepcopy
+from heapq import heapify, heappop, heappush
+import copy
 import heapq
+import numbers
 import re
 import string
+import struct
+import sys
+import threading
+import time
 
 try:
     import datrie
 except ImportError:
     pass
 
+PY2 = sys.version_info[0] == 2
+if PY2:
+    string_types = basestring,
+else:
+    string_types = str,
+
 
 def recursive_dict():
     return defaultdict(recursive_dict)
@@ -39,9 +53,9 @@ class _AttributeList(list):
     pass
 
 
-class _AliasDict(_AttributeDict):
+class _AliasDict(AttributeDict):
     """
-    `_AttributeDict` subclass that allows for "aliasing" of keys to other keys.
+    `AttributeDict` subclass that allows for "aliasing" of keys to other keys.
 
     Upon creation, takes an ``aliases`` mapping, which should map alias names
     to lists of key names. Aliases do not store their own value, but instead
@@ -75,7 +89,7 @@ class _AliasDict(_AttributeDict):
             init(arg)
         else:
             init()
-        # Can't use super() here because of _AttributeDict's setattr override
+        # Set it as an attribute, not as a key
         dict.__setattr__(self, 'aliases', aliases)
 
     def __setitem__(self, key, value):
@@ -244,6 +258,253 @@ class PrefixQueue(object):
     pop = pop_from_queue_of_longest_prefix
 
 
+class _PrefixNode(object):
+    __slots__ = ('children', 'weight', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.weight = None
+        # Best entries of the subtree as ``(-weight, key)``, ascending
+        self.top = []
+
+
+class PrefixIndex(object):
+    """Weighted prefix index for top-k completion.
+
+    Where `PrefixQueue` answers "which queue does this key fall under",
+    `PrefixIndex` answers "which are the best-weighted keys starting with
+    this prefix". Every trie node caches the ``k`` best entries of its
+    subtree, so a completion is a walk down the prefix plus a slice, no matter
+    how many keys live below it::
+
+        index = PrefixIndex(k=3)
+        index.set('python', 10)
+        index.set('pypy', 5)
+        index.set('perl', 7)
+        index.top('p')   # [('python', 10), ('perl', 7), ('pypy', 5)]
+        index.top('py')  # [('python', 10), ('pypy', 5)]
+
+    Updates only touch the nodes on the path of the changed key. The index
+    can be written to a compact binary file with `save` and read back with
+    `load`, which rebuilds the caches in a single pass.
+    """
+    MAGIC = b'BPXI'
+    VERSION = 2
+
+    def __init__(self, k=10):
+        self.k = k
+        self._root = _PrefixNode()
+        self._weights = {}
+
+    def __len__(self):
+        return len(self._weights)
+
+    def __contains__(self, key):
+        return key in self._weights
+
+    def get(self, key, default=None):
+        return self._weights.get(key, default)
+
+    def items(self):
+        return self._weights.items()
+
+    def _path(self, key, create=False):
+        node = self._root
+        path = [node]
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[char] = _PrefixNode()
+            node = child
+            path.append(node)
+        return path
+
+    def _refresh(self, node, key):
+        candidates = [] if node.weight is None else [(-node.weight, key)]
+        for child in node.children.values():
+            candidates.extend(child.top)
+        node.top = heapq.nsmallest(self.k, candidates)
+
+    def set(self, key, weight):
+        """Insert ``key`` or change its weight."""
+        old = self._weights.get(key)
+        path = self._path(key, create=True)
+        path[-1].weight = weight
+        self._weights[key] = weight
+        entry = (-weight, key)
+        stale = None if old is None else (-old, key)
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            top = node.top
+            if stale is not None and stale in top:
+                if weight < old and len(top) == self.k:
+                    # An entry cut off from this cache may now beat it
+                    self._refresh(node, key[:depth])
+                else:
+                    top.remove(stale)
+                    top.append(entry)
+                    top.sort()
+            elif len(top) < self.k or entry < top[-1]:
+                top.append(entry)
+                top.sort()
+                del top[self.k:]
+            else:
+                # Not in this cache before or after, so not in any
+                # ancestor's either
+                break
+
+    def remove(self, key):
+        """Remove ``key`` from the index; raises `KeyError` if missing."""
+        old = self._weights.pop(key)
+        path = self._path(key)
+        path[-1].weight = None
+        stale = (-old, key)
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            if depth and not node.children and node.weight is None:
+                del path[depth - 1].children[key[depth - 1]]
+                continue
+            if stale not in node.top:
+                break
+            self._refresh(node, key[:depth])
+
+    def top(self, prefix='', k=None):
+        """Return up to ``k`` ``(key, weight)`` pairs starting with
+        ``prefix``, best first.
+
+        Asking for more than the index's own ``k`` falls back to scanning
+        the subtree.
+        """
+        k = self.k if k is None else k
+        path = self._path(prefix)
+        if path is None:
+            return []
+        node = path[-1]
+        if k <= self.k:
+            return [(key, -weight) for weight, key in node.top[:k]]
+        return [(key, -weight) for weight, key in
+                heapq.nsmallest(k, self._iter_subtree(node, prefix))]
+
+    complete = top
+
+    def _iter_subtree(self, node, prefix):
+        stack = [(node, prefix)]
+        while stack:
+            node, prefix = stack.pop()
+            if node.weight is not None:
+                yield -node.weight, prefix
+            for char, child in node.children.items():
+                stack.append((child, prefix + char))
+
+    def update(self, items):
+        """Bulk insert ``(key, weight)`` pairs.
+
+        Caches are rebuilt once at the end instead of once per key, which is
+        much faster for large batches.
+        """
+        root = self._root
+        weights = self._weights
+        for key, weight in items:
+            node = root
+            for char in key:
+                children = node.children
+                node = children.get(char)
+                if node is None:
+                    node = children[char] = _PrefixNode()
+            node.weight = weight
+            weights[key] = weight
+        self._rebuild()
+
+    def _rebuild(self):
+        # Iterative post-order walk; keys may be deeper than the recursion
+        # limit.
+        k = self.k
+        stack = [(self._root, '', False)]
+        while stack:
+            node, key, visited = stack.pop()
+            if not visited:
+                stack.append((node, key, True))
+                for char, child in node.children.items():
+                    stack.append((child, key + char, False))
+                continue
+            children = node.children
+            if node.weight is None and len(children) == 1:
+                # Chains of single children are the common case
+                for child in children.values():
+                    node.top = child.top[:]
+                continue
+            candidates = [] if node.weight is None else [(-node.weight, key)]
+            for child in children.values():
+                candidates.extend(child.top)
+            candidates.sort()
+            del candidates[k:]
+            node.top = candidates
+
+    def save(self, path):
+        """Write the index to ``path`` in a compact binary format.
+
+        The layout is a fixed header followed by the key lengths as
+        little-endian uint32, one struct code per weight, ``q`` for integers
+        or ``d`` for anything else, the weights packed with those codes and
+        the concatenated utf-8 encoded keys, so files can be moved between
+        machines and `load` can unpack each part with a single call.
+        Integer weights come back as integers, unless they don't fit in 64
+        bits and are stored as doubles; all other weights come back as
+        floats.
+        """
+        keys = sorted(self._weights)
+        encoded = [key.encode('utf-8') for key in keys]
+        weights = [self._weights[key] for key in keys]
+        codes = ''.join(
+            'q' if isinstance(weight, numbers.Integral) and
+            -1 << 63 <= weight < 1 << 63 else 'd' for weight in weights)
+        count = len(keys)
+        with open(path, 'wb') as f:
+            f.write(struct.pack('<4sHII', self.MAGIC, self.VERSION,
+                                self.k, count))
+            f.write(struct.pack('<{0}I'.format(count),
+                                *[len(key) for key in encoded]))
+            f.write(codes.encode('ascii'))
+            f.write(struct.pack('<' + codes, *weights))
+            f.write(b''.join(encoded))
+
+    @classmethod
+    def load(cls, path, k=None):
+        """Read an index written by `save`."""
+        header = struct.Struct('<4sHII')
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, saved_k, count = header.unpack_from(data)
+        if magic != cls.MAGIC or version not in (1, cls.VERSION):
+            raise ValueError('Not a prefix index file: {0}'.format(path))
+        offset = header.size
+        lengths = struct.unpack_from('<{0}I'.format(count), data, offset)
+        offset += 4 * count
+        if version == 1:
+            # Every weight was a double
+            codes = 'd' * count
+        else:
+            codes = data[offset:offset + count].decode('ascii')
+            offset += count
+            if codes.strip('qd'):
+                raise ValueError('Not a prefix index file: {0}'.format(path))
+        weights = struct.unpack_from('<' + codes, data, offset)
+        offset += 8 * count
+        blob = data[offset:]
+
+        def iter_keys():
+            start = 0
+            for length in lengths:
+                yield blob[start:start + length].decode('utf-8')
+                start += length
+
+        index = cls(k=saved_k if k is None else k)
+        index.update(zip(iter_keys(), weights))
+        return index
+
+
 class OrderedSet(object):
     """
     A set which keeps the ordering of the inserted items.
@@ -281,6 +542,9 @@ class OrderedSet(object):
         return len(self.dict)
 
 
+missing = object()
+
+
 class OrderedDict(dict):
     """Ordered dict implementation.
 
@@ -379,7 +643,7 @@ class LimitedSet(object):
         self._refresh_heap()
 
     def _refresh_heap(self):
-        self._heap[:] = [(t, key) for key, t in items(self._data)]
+        self._heap[:] = [(t, key) for key, t in iteritems(self._data)]
         heapify(self._heap)
 
     def add(self, key, now=time.time, heappush=heappush):
@@ -607,14 +871,14 @@ class MultiValueDict(dict):
 
     def _iterlists(self):
         """Yields (key, list) pairs."""
-        return six.iteritems(super(MultiValueDict, self))
+        return iteritems(super(MultiValueDict, self))
 
     def _itervalues(self):
         """Yield the last value on every key list."""
         for key in self:
             yield self[key]
 
-    if six.PY3:
+    if not PY2:
         items = _iteritems
         lists = _iterlists
         values = _itervalues
@@ -654,7 +918,7 @@ class MultiValueDict(dict):
                         self.setlistdefault(key).append(value)
                 except TypeError:
                     raise ValueError("MultiValueDict.update() takes either a MultiValueDict or dictionary")
-        for key, value in six.iteritems(kwargs):
+        for key, value in iteritems(kwargs):
             self.setlistdefault(key).append(value)
 
     def dict(self):
@@ -747,10 +1011,14 @@ def chop(seq, size):
     return [seq[i:i+size] for i in xrange(0,len(seq),size)]
 
 
-import collections
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:
+    # Python 2
+    from collections import Mapping, MutableMapping
 
 
-class CaseInsensitiveDict(collections.MutableMapping):
+class CaseInsensitiveDict(MutableMapping):
     """
     A case-insensitive ``dict``-like object.
 
@@ -810,7 +1078,7 @@ class CaseInsensitiveDict(collections.MutableMapping):
         )
 
     def __eq__(self, other):
-        if isinstance(other, collections.Mapping):
+        if isinstance(other, Mapping):
             other = CaseInsensitiveDict(other)
         else:
             return NotImplemented
@@ -825,6 +1093,248 @@ class CaseInsensitiveDict(collections.MutableMapping):
         return str(dict(self.items()))
 
 
+class HTTPHeaders(object):
+    """
+    A case-insensitive, order-preserving multi-value mapping for headers.
+
+    Combines ``CaseInsensitiveDict`` with the ``MultiDict`` API. Every header
+    line is kept as a ``(name, value)`` pair in one flat list, and a
+    ``lowercase name -> [positions]`` index points into it, so ``getlist`` is
+    a single dict lookup and iteration never touches per-key buckets::
+
+        h = HTTPHeaders.parse(b'Set-Cookie: a=1\\r\\nset-cookie: b=2\\r\\n')
+        h.getlist('SET-COOKIE') == ['a=1', 'b=2']  # True
+        h['Set-Cookie'] == 'a=1'  # True, first value wins like MultiDict
+        list(h.items(multi=True))  # both lines, original case and order
+
+    Removed entries are left as tombstones in the flat list and compacted
+    once they make up half of it.
+    """
+
+    #: Cache of ``name -> name.lower()`` shared by all instances. Header names
+    #: come from a small vocabulary, so this saves the ``lower()`` allocation
+    #: on nearly every access.
+    _lower_cache = {}
+    _lower_cache_size = 1024
+
+    def __init__(self, data=None, **kwargs):
+        self._items = []
+        self._index = {}
+        self._dead = 0
+        if data is not None:
+            self.update(data)
+        if kwargs:
+            self.update(kwargs)
+
+    @classmethod
+    def _lower(cls, name):
+        try:
+            return cls._lower_cache[name]
+        except KeyError:
+            lower = name.lower()
+            if len(cls._lower_cache) < cls._lower_cache_size:
+                cls._lower_cache[name] = lower
+            return lower
+
+    @classmethod
+    def parse(cls, headers, encoding='latin-1'):
+        """Build headers from a raw header block.
+
+        ``headers`` may be text or bytes; bytes are decoded once with
+        ``encoding`` before splitting. Folded continuation lines are joined
+        to the preceding value.
+        """
+        if isinstance(headers, bytes):
+            headers = headers.decode(encoding)
+        self = cls()
+        items = self._items
+        index = self._index
+        lower = cls._lower
+        # Not splitlines(): decoded values may contain \x85, \x0c, U+2028...
+        for line in headers.split('\n'):
+            line = line.rstrip('\r')
+            if not line:
+                continue
+            if line[0] in ' \t':
+                if items:
+                    name, value = items[-1]
+                    items[-1] = (name, value + ' ' + line.strip())
+                continue
+            name, sep, value = line.partition(':')
+            if not sep:
+                continue
+            name = name.strip()
+            key = lower(name)
+            try:
+                index[key].append(len(items))
+            except KeyError:
+                index[key] = [len(items)]
+            items.append((name, value.strip()))
+        return self
+
+    def _compact(self):
+        items = [item for item in self._items if item is not None]
+        index = {}
+        lower = self._lower
+        for position, (name, _) in enumerate(items):
+            index.setdefault(lower(name), []).append(position)
+        self._items = items
+        self._index = index
+        self._dead = 0
+
+    def add(self, key, value):
+        """Add a new value for the header, keeping any existing ones."""
+        lower = self._lower(key)
+        positions = self._index.get(lower)
+        if positions is None:
+            self._index[lower] = [len(self._items)]
+        else:
+            positions.append(len(self._items))
+        self._items.append((key, value))
+
+    def getlist(self, key, type=None):
+        """Return all values for the header in the order they were added."""
+        positions = self._index.get(self._lower(key))
+        if not positions:
+            return []
+        items = self._items
+        if type is None:
+            return [items[i][1] for i in positions]
+        result = []
+        for i in positions:
+            try:
+                result.append(type(items[i][1]))
+            except ValueError:
+                pass
+        return result
+
+    def get(self, key, default=None, type=None):
+        try:
+            rv = self[key]
+            if type is not None:
+                rv = type(rv)
+        except (KeyError, ValueError):
+            rv = default
+        return rv
+
+    def poplist(self, key):
+        """Remove the header and return all of its values."""
+        positions = self._index.pop(self._lower(key), None)
+        if not positions:
+            return []
+        items = self._items
+        values = []
+        for i in positions:
+            values.append(items[i][1])
+            items[i] = None
+        self._dead += len(positions)
+        if self._dead * 2 > len(items):
+            self._compact()
+        return values
+
+    def pop(self, key, *default):
+        values = self.poplist(key)
+        if values:
+            return values[0]
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def setlist(self, key, values):
+        self.poplist(key)
+        for value in values:
+            self.add(key, value)
+
+    def __getitem__(self, key):
+        positions = self._index.get(self._lower(key))
+        if not positions:
+            raise KeyError(key)
+        return self._items[positions[0]][1]
+
+    def __setitem__(self, key, value):
+        self.poplist(key)
+        self.add(key, value)
+
+    def __delitem__(self, key):
+        if not self.poplist(key):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self._lower(key) in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return self.keys()
+
+    def keys(self):
+        """Iterate over header names, each once, in order of first
+        appearance."""
+        return (key for key, _ in self.items())
+
+    def values(self):
+        return (value for _, value in self.items())
+
+    def items(self, multi=False):
+        """Iterate over ``(name, value)`` pairs in insertion order.
+
+        With ``multi`` every header line is returned, otherwise only the first
+        value of each header.
+        """
+        if multi:
+            return (item for item in self._items if item is not None)
+        items = self._items
+        return (items[positions[0]] for positions in
+                sorted(self._index.values(), key=lambda p: p[0]))
+
+    def lower_items(self):
+        """Like ``items(multi=True)``, but with all lowercase names."""
+        lower = self._lower
+        return ((lower(name), value) for name, value in self.items(multi=True))
+
+    def update(self, data):
+        """Extend the headers with pairs from a mapping or an iterable.
+
+        ``MultiDict``-like mappings and ``HTTPHeaders`` contribute every
+        value; a plain ``dict`` of lists or tuples contributes each element.
+        """
+        if isinstance(data, HTTPHeaders):
+            data = data.items(multi=True)
+        elif hasattr(data, 'items'):
+            try:
+                data = list(data.items(multi=True))
+            except TypeError:
+                data = [(key, value)
+                        for key, values in data.items()
+                        for value in (values
+                                      if isinstance(values, (list, tuple))
+                                      else [values])]
+        for key, value in data:
+            self.add(key, value)
+
+    def copy(self):
+        return self.__class__(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, HTTPHeaders):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        for key in self._index:
+            if self.getlist(key) != other.getlist(key):
+                return False
+        return True
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__,
+                           list(self.items(multi=True)))
+
+
 class LookupDict(dict):
     """Dictionary lookup object."""
 
@@ -847,7 +1357,7 @@ class LookupDict(dict):
 class _symbol(int):
     def __new__(self, name, doc=None, canonical=None):
         """Construct a new named symbol."""
-        assert isinstance(name, compat.string_types)
+        assert isinstance(name, string_types)
         if canonical is None:
             canonical = hash(name)
         v = int.__new__(_symbol, canonical)
@@ -890,7 +1400,7 @@ class symbol(object):
 
     """
     symbols = {}
-    _lock = compat.threading.Lock()
+    _lock = threading.Lock()
 
     def __new__(cls, name, doc=None, canonical=None):
         cls._lock.acquire()
@@ -944,6 +1454,49 @@ class TypeConversionDict(dict):
 
 ##
 
+_missing = object()
+
+
+class BadRequestKeyError(KeyError):
+    """The `KeyError` raised by :class:`MultiDict` and its subclasses, named
+    after the Werkzeug exception they raise."""
+
+
+def iterkeys(d, *args, **kwargs):
+    return iter(d.keys(*args, **kwargs))
+
+
+def itervalues(d, *args, **kwargs):
+    return iter(d.values(*args, **kwargs))
+
+
+def iteritems(d, *args, **kwargs):
+    return iter(d.items(*args, **kwargs))
+
+
+def iterlists(d, *args, **kwargs):
+    return iter(d.lists(*args, **kwargs))
+
+
+def iter_multi_items(mapping):
+    """Iterates over the items of a mapping yielding keys and values
+    without dropping any from more complex structures.
+    """
+    if isinstance(mapping, MultiDict):
+        for item in iteritems(mapping, multi=True):
+            yield item
+    elif isinstance(mapping, dict):
+        for key, value in iteritems(mapping):
+            if isinstance(value, (tuple, list)):
+                for v in value:
+                    yield key, v
+            else:
+                yield key, value
+    else:
+        for item in mapping:
+            yield item
+
+
 def native_itermethods(names):
     if not PY2:
         return lambda x: x
@@ -1040,7 +1593,7 @@ class MultiDict(TypeConversionDict):
         """
         if key in self:
             return dict.__getitem__(self, key)[0]
-        raise exceptions.BadRequestKeyError(key)
+        raise BadRequestKeyError(key)
 
     def __setitem__(self, key, value):
         """Like :meth:`add` but removes an existing key first.
@@ -1247,7 +1800,7 @@ class MultiDict(TypeConversionDict):
         except KeyError as e:
             if default is not _missing:
                 return default
-            raise exceptions.BadRequestKeyError(str(e))
+            raise BadRequestKeyError(str(e))
 
     def popitem(self):
         """Pop an item from the dict."""
@@ -1255,7 +1808,7 @@ class MultiDict(TypeConversionDict):
             item = dict.popitem(self)
             return (item[0], item[1][0])
         except KeyError as e:
-            raise exceptions.BadRequestKeyError(str(e))
+            raise BadRequestKeyError(str(e))
 
     def poplist(self, key):
         """Pop the list for a key from the dict.  If the key is not in the dict
@@ -1272,7 +1825,7 @@ class MultiDict(TypeConversionDict):
         try:
             return dict.popitem(self)
         except KeyError as e:
-            raise exceptions.BadRequestKeyError(str(e))
+            raise BadRequestKeyError(str(e))
 
     def __copy__(self):
         return self.copy()
@@ -1284,6 +1837,38 @@ class MultiDict(TypeConversionDict):
         return '%s(%r)' % (self.__class__.__name__, list(iteritems(self, multi=True)))
 
 
+class _omd_bucket(object):
+
+    """Wraps values in the :class:`OrderedMultiDict`.  This makes it
+    possible to keep an order over multiple different keys.  It requires
+    a lot of extra memory and slows down access a lot, but makes it
+    possible to access elements in O(1) and iterate in O(n).
+    """
+    __slots__ = ('prev', 'key', 'value', 'next')
+
+    def __init__(self, omd, key, value):
+        self.prev = omd._last_bucket
+        self.key = key
+        self.value = value
+        self.next = None
+
+        if omd._first_bucket is None:
+            omd._first_bucket = self
+        if omd._last_bucket is not None:
+            omd._last_bucket.next = self
+        omd._last_bucket = self
+
+    def unlink(self, omd):
+        if self.prev:
+            self.prev.next = self.next
+        if self.next:
+            self.next.prev = self.prev
+        if omd._first_bucket is self:
+            omd._first_bucket = self.next
+        if omd._last_bucket is self:
+            omd._last_bucket = self.prev
+
+
 @native_itermethods(['keys', 'values', 'items', 'lists', 'listvalues'])
 class OrderedMultiDict(MultiDict):
 
@@ -1350,7 +1935,7 @@ class OrderedMultiDict(MultiDict):
     def __getitem__(self, key):
         if key in self:
             return dict.__getitem__(self, key)[0].value
-        raise exceptions.BadRequestKeyError(key)
+        raise BadRequestKeyError(key)
 
     def __setitem__(self, key, value):
         self.poplist(key)
@@ -1437,7 +2022,7 @@ class OrderedMultiDict(MultiDict):
         except KeyError as e:
             if default is not _missing:
                 return default
-            raise exceptions.BadRequestKeyError(str(e))
+            raise BadRequestKeyError(str(e))
         for bucket in buckets:
             bucket.unlink(self)
         return buckets[0].value
@@ -1446,7 +2031,7 @@ class OrderedMultiDict(MultiDict):
         try:
             key, buckets = dict.popitem(self)
         except KeyError as e:
-            raise exceptions.BadRequestKeyError(str(e))
+            raise BadRequestKeyError(str(e))
         for bucket in buckets:
             bucket.unlink(self)
         return key, buckets[0].value
@@ -1455,12 +2040,230 @@ class OrderedMultiDict(MultiDict):
         try:
             key, buckets = dict.popitem(self)
         except KeyError as e:
-            raise exceptions.BadRequestKeyError(str(e))
+            raise BadRequestKeyError(str(e))
         for bucket in buckets:
             bucket.unlink(self)
         return key, [x.value for x in buckets]
 
 
+_omd_missing = object()
+
+
+@native_itermethods(['keys', 'values', 'items', 'lists', 'listvalues'])
+class FlatOrderedMultiDict(MultiDict):
+
+    """An :class:`OrderedMultiDict` backed by flat arrays.
+
+    Instead of a linked bucket object per value, keys and values are kept in
+    two parallel lists and the dict itself maps every key to the list of
+    positions it occupies.  Adding a value is two list appends, and
+    iterating over all items walks the arrays directly, which makes it a lot
+    cheaper to build from big query strings or form bodies:
+
+    >>> d = FlatOrderedMultiDict([('a', '1'), ('b', '2'), ('a', '3')])
+    >>> d.getlist('a')
+    ['1', '3']
+    >>> list(d.items(multi=True))
+    [('a', '1'), ('b', '2'), ('a', '3')]
+
+    Removing a key leaves tombstones behind in the arrays; they are compacted
+    away once they make up half of the storage.
+
+    As with :class:`OrderedMultiDict`, use :meth:`to_dict` instead of
+    ``dict(multidict)``, which would expose the internal position lists.
+    """
+
+    def __init__(self, mapping=None):
+        dict.__init__(self)
+        self._keys = []
+        self._values = []
+        self._dead = 0
+        if mapping is not None:
+            FlatOrderedMultiDict.update(self, mapping)
+
+    def __eq__(self, other):
+        if not isinstance(other, MultiDict):
+            return NotImplemented
+        if isinstance(other, (OrderedMultiDict, FlatOrderedMultiDict)):
+            return list(self.items(multi=True)) == \
+                list(other.items(multi=True))
+        if len(self) != len(other):
+            return False
+        for key, values in self.lists():
+            if other.getlist(key) != values:
+                return False
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __reduce_ex__(self, protocol):
+        return type(self), (list(self.items(multi=True)),)
+
+    def __getstate__(self):
+        return list(self.items(multi=True))
+
+    def __setstate__(self, values):
+        dict.clear(self)
+        self._keys = []
+        self._values = []
+        self._dead = 0
+        for key, value in values:
+            self.add(key, value)
+
+    def __getitem__(self, key):
+        if key in self:
+            return self._values[dict.__getitem__(self, key)[0]]
+        raise BadRequestKeyError(key)
+
+    def __setitem__(self, key, value):
+        self.poplist(key)
+        self.add(key, value)
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def _compact(self):
+        keys, values = [], []
+        dict.clear(self)
+        for key, value in zip(self._keys, self._values):
+            if value is _omd_missing:
+                continue
+            dict.setdefault(self, key, []).append(len(keys))
+            keys.append(key)
+            values.append(value)
+        self._keys = keys
+        self._values = values
+        self._dead = 0
+
+    def _remove(self, positions):
+        for i in positions:
+            self._keys[i] = self._values[i] = _omd_missing
+        self._dead += len(positions)
+        if self._dead * 2 > len(self._keys):
+            self._compact()
+
+    def keys(self):
+        return (key for key, value in self.items())
+
+    __iter__ = keys
+
+    def values(self):
+        return (value for key, value in self.items())
+
+    def items(self, multi=False):
+        if multi:
+            if not self._dead:
+                return zip(self._keys, self._values)
+            return ((key, value)
+                    for key, value in zip(self._keys, self._values)
+                    if value is not _omd_missing)
+        values = self._values
+        return ((key, values[positions[0]])
+                for key, positions in self._iterpositions())
+
+    def _iterpositions(self):
+        # Keys in order of their first value
+        keys = self._keys
+        for i, key in enumerate(keys):
+            if key is _omd_missing:
+                continue
+            positions = dict.__getitem__(self, key)
+            if positions[0] == i:
+                yield key, positions
+
+    def lists(self):
+        values = self._values
+        for key, positions in self._iterpositions():
+            yield key, [values[i] for i in positions]
+
+    def listvalues(self):
+        for key, values in self.lists():
+            yield values
+
+    def add(self, key, value):
+        dict.setdefault(self, key, []).append(len(self._keys))
+        self._keys.append(key)
+        self._values.append(value)
+
+    def getlist(self, key, type=None):
+        try:
+            positions = dict.__getitem__(self, key)
+        except KeyError:
+            return []
+        values = self._values
+        if type is None:
+            return [values[i] for i in positions]
+        result = []
+        for i in positions:
+            try:
+                result.append(type(values[i]))
+            except ValueError:
+                pass
+        return result
+
+    def setlist(self, key, new_list):
+        self.poplist(key)
+        for value in new_list:
+            self.add(key, value)
+
+    def setlistdefault(self, key, default_list=None):
+        raise TypeError('setlistdefault is unsupported for '
+                        'ordered multi dicts')
+
+    def update(self, mapping):
+        if isinstance(mapping, MultiDict):
+            mapping = mapping.items(multi=True)
+        elif isinstance(mapping, dict):
+            mapping = [(key, value)
+                       for key, values in mapping.items()
+                       for value in (values
+                                     if isinstance(values, (tuple, list))
+                                     else [values])]
+        add = self.add
+        for key, value in mapping:
+            add(key, value)
+
+    def to_dict(self, flat=True):
+        if flat:
+            return dict(self.items())
+        return dict(self.lists())
+
+    def clear(self):
+        dict.clear(self)
+        self._keys = []
+        self._values = []
+        self._dead = 0
+
+    def poplist(self, key):
+        positions = dict.pop(self, key, ())
+        values = [self._values[i] for i in positions]
+        if positions:
+            self._remove(positions)
+        return values
+
+    def pop(self, key, default=_omd_missing):
+        values = self.poplist(key)
+        if values:
+            return values[0]
+        if default is not _omd_missing:
+            return default
+        raise BadRequestKeyError(key)
+
+    def popitem(self):
+        key, values = self.popitemlist()
+        return key, values[0]
+
+    def popitemlist(self):
+        try:
+            key, positions = dict.popitem(self)
+        except KeyError as e:
+            raise BadRequestKeyError(str(e))
+        values = [self._values[i] for i in positions]
+        self._remove(positions)
+        return key, values
+
+
 ##
 
 
@@ -1528,7 +2331,7 @@ class SyncDict(object):
 
     """
     def __init__(self):
-        self.mutex = _threading.Lock()
+        self.mutex = threading.Lock()
         self.dict = {}
 
     def get(self, key, createfunc, *args, **kwargs):
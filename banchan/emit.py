@@ -1,24 +1,164 @@
 from collections import defaultdict
+import fnmatch
+import re
 import string
+import sys
 
 import datrie
 
+from .latency import LatencyRecorder
+
+try:
+    unicode
+except NameError:  # Python 3
+    unicode = str
+
 
 class EmitterMixin(object):
     # TODO: Non-prefix version with datrie
 
+    #: Number of distinct event strings whose resolved callbacks are cached
+    callback_cache_size = 1024
+
     def __init__(self, *args, **kwargs):
         super(EmitterMixin, self).__init__(*args, **kwargs)
         self._callbacks = datrie.Trie(string.printable)
+        # [(pattern, compiled regex, callbacks)] for glob subscriptions
+        self._wildcards = []
+        # event -> tuple of callbacks, rebuilt lazily after on()/off()
+        self._resolved = {}
+        self.recorder = None
+
+    def instrument(self, recorder=None):
+        """Start recording how long each callback takes in `emit`.
+
+        Works like `dispatch.Signal.instrument`; returns the recorder. The
+        time of a callback `AsyncEmitterMixin.emit` awaits runs until its
+        result is done, including waits for the other callbacks.
+        """
+        if recorder is None:
+            recorder = LatencyRecorder()
+        self.recorder = recorder
+        return recorder
+
+    def uninstrument(self):
+        self.recorder = None
+
+    @staticmethod
+    def is_wildcard(event):
+        return any(char in event for char in '*?[')
 
     def on(self, event, callback):
+        """Call `callback` on every emit of `event` or of an event it is a
+        prefix of.
+
+        An `event` containing glob characters (``*``, ``?``, ``[...]``)
+        subscribes to every event matching the whole pattern instead, e.g.
+        ``'user.*.failed'``.
+        """
         event = unicode(event)
-        if event not in self._callbacks:
-            self._callbacks[event] = []
-        self._callbacks[event].append(callback)
+        if self.is_wildcard(event):
+            for pattern, _, callbacks in self._wildcards:
+                if pattern == event:
+                    callbacks.append(callback)
+                    break
+            else:
+                self._wildcards.append(
+                    (event, re.compile(fnmatch.translate(event)), [callback]))
+        else:
+            if event not in self._callbacks:
+                self._callbacks[event] = []
+            self._callbacks[event].append(callback)
+        self._resolved = {}
 
-    def emit(self, event, *args, **kwargs):
+    def off(self, event, callback=None):
+        """Remove `callback` from `event`, or every callback of `event` when
+        it is omitted. Returns whether anything was removed."""
         event = unicode(event)
-        for callbacks in self._callbacks.iter_prefix_values(event):
-            for callback in callbacks:
+        removed = False
+        if self.is_wildcard(event):
+            for i, (pattern, _, callbacks) in enumerate(self._wildcards):
+                if pattern == event:
+                    removed = self._remove_callback(callbacks, callback)
+                    if not callbacks:
+                        del self._wildcards[i]
+                    break
+        elif event in self._callbacks:
+            callbacks = self._callbacks[event]
+            removed = self._remove_callback(callbacks, callback)
+            if not callbacks:
+                del self._callbacks[event]
+        if removed:
+            self._resolved = {}
+        return removed
+
+    @staticmethod
+    def _remove_callback(callbacks, callback):
+        if callback is None:
+            removed = bool(callbacks)
+            del callbacks[:]
+            return removed
+        try:
+            callbacks.remove(callback)
+        except ValueError:
+            return False
+        return True
+
+    def _resolve(self, event):
+        # Hold on to the cache being filled, so that a concurrent on()/off()
+        # swapping in a fresh one can't receive a stale entry
+        cache = self._resolved
+        key = unicode(event)
+        resolved = [callback
+                    for callbacks in self._callbacks.iter_prefix_values(key)
+                    for callback in callbacks]
+        for _, regex, callbacks in self._wildcards:
+            if regex.match(key):
+                resolved.extend(callbacks)
+        resolved = tuple(resolved)
+        if len(cache) >= self.callback_cache_size:
+            cache.clear()
+        cache[event] = resolved
+        return resolved
+
+    def emit(self, event, *args, **kwargs):
+        try:
+            callbacks = self._resolved[event]
+        except KeyError:
+            callbacks = self._resolve(event)
+        recorder = self.recorder
+        for callback in callbacks:
+            if recorder is None:
                 callback(*args, **kwargs)
+            else:
+                recorder.call(callback, *args, **kwargs)
+
+
+if sys.version_info[0] >= 3:
+    from .emit_async import AsyncEmitterMethods, Subscription  # noqa
+
+    class AsyncEmitterMixin(AsyncEmitterMethods, EmitterMixin):
+        """`EmitterMixin` whose `emit` is a coroutine.
+
+        Subscriptions work the same, prefixes and wildcards included. Callbacks
+        may be plain functions or coroutine functions; everything they return
+        that is awaitable is awaited concurrently, so an emit takes as long as
+        its slowest callback.
+
+        Consumers that want to pull events at their own pace can `subscribe` to
+        get a bounded queue. When it is full, `emit` waits for the consumer to
+        catch up instead of buffering without limit.
+
+        Only available on Python 3; the coroutines live in `emit_async`.
+        """
+
+        def once(self, event, callback):
+            """Like `on`, but the callback is removed before its first call.
+
+            Returns the wrapper actually registered, which is what `off` needs.
+            """
+            def wrapper(*args, **kwargs):
+                self.off(event, wrapper)
+                return callback(*args, **kwargs)
+            self.on(event, wrapper)
+            return wrapper
@@ -0,0 +1,134 @@
+import asyncio
+import inspect
+
+
+class AsyncEmitterMethods(object):
+    """The coroutine methods of `emit.AsyncEmitterMixin`, which only exists
+    on Python 3 since ``async def`` is a syntax error on Python 2."""
+
+    async def emit(self, event, *args, **kwargs):
+        try:
+            callbacks = self._resolved[event]
+        except KeyError:
+            callbacks = self._resolve(event)
+        recorder = self.recorder
+        pending = []
+        for callback in callbacks:
+            if recorder is None:
+                result = callback(*args, **kwargs)
+                if inspect.isawaitable(result):
+                    pending.append(result)
+                continue
+            start = recorder.timer()
+            try:
+                result = callback(*args, **kwargs)
+            except Exception:
+                recorder.record(callback, recorder.timer() - start)
+                raise
+            if inspect.isawaitable(result):
+                pending.append(self._finish_recording(
+                    recorder, callback, start, result))
+            else:
+                recorder.record(callback, recorder.timer() - start)
+        if pending:
+            await asyncio.gather(*pending)
+
+    @staticmethod
+    async def _finish_recording(recorder, callback, start, awaitable):
+        try:
+            return await awaitable
+        finally:
+            recorder.record(callback, recorder.timer() - start)
+
+    async def wait_for(self, event, timeout=None):
+        """Wait for the next emit matching `event` and return its
+        positional arguments: the argument itself if there was exactly one,
+        otherwise a tuple.
+
+        Raises `asyncio.TimeoutError` after `timeout` seconds if given.
+        """
+        future = asyncio.get_running_loop().create_future()
+
+        def resolve(*args, **kwargs):
+            if not future.done():
+                future.set_result(args[0] if len(args) == 1 else args)
+        wrapper = self.once(event, resolve)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.off(event, wrapper)
+
+    def subscribe(self, event, maxsize=100):
+        """Return a `Subscription` queueing every emit matching `event`.
+
+        At most `maxsize` events are held for it; beyond that `emit` waits
+        until the consumer takes one out.
+        """
+        subscription = Subscription(self, event, maxsize)
+        self.on(event, subscription)
+        return subscription
+
+
+_closed = object()
+
+
+class Subscription(object):
+    """Bounded queue of ``(args, kwargs)`` for one `AsyncEmitterMixin`
+    subscriber. Iterate over it with ``async for``, or call `get`."""
+
+    def __init__(self, emitter, event, maxsize=100):
+        self.emitter = emitter
+        self.event = event
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = False
+        # Puts waiting for room in a full queue, cancelled by close()
+        self._puts = set()
+
+    def __call__(self, *args, **kwargs):
+        # Only returns an awaitable for emit when it has to wait for room
+        if self.closed:
+            return None
+        if not self.queue.full():
+            self.queue.put_nowait((args, kwargs))
+            return None
+        return self._put((args, kwargs))
+
+    async def _put(self, item):
+        put = asyncio.ensure_future(self.queue.put(item))
+        self._puts.add(put)
+        try:
+            # Returns without raising when close() cancels the put
+            await asyncio.wait([put])
+        finally:
+            self._puts.discard(put)
+            put.cancel()
+
+    async def get(self):
+        """Return the next ``(args, kwargs)``; raises `StopAsyncIteration`
+        once the subscription is closed and drained."""
+        if self.closed and self.queue.empty():
+            raise StopAsyncIteration
+        item = await self.queue.get()
+        if item is _closed:
+            raise StopAsyncIteration
+        return item
+
+    def __aiter__(self):
+        return self
+
+    __anext__ = get
+
+    def close(self):
+        """Unsubscribe. Events already queued can still be read; emits
+        still waiting for room in the queue give up theirs."""
+        if self.closed:
+            return
+        self.closed = True
+        self.emitter.off(self.event, self)
+        for put in self._puts:
+            put.cancel()
+        try:
+            # Wake up a consumer blocked on an empty queue
+            self.queue.put_nowait(_closed)
+        except asyncio.QueueFull:
+            pass
@@ -1,12 +1,24 @@
-from math import radians, cos, sin, asin, sqrt
+from math import radians, degrees, cos, sin, asin, sqrt, hypot, pi
+import csv
 import logging
+import mmap
+import os
 import re
+import socket
+import struct
 import urllib2
 
 try:
     from rtree.index import Rtree
 except ImportError:
-    pass
+    Rtree = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .cache import LRUCache
 
 
 logger = logging.getLogger(__name__)
@@ -16,9 +28,18 @@ PATTERN_COUNTRY = re.compile(r'Country: (.+)\n')
 PATTERN_CITY = re.compile('City: (.+)\n')
 
 
+# Offline database used by `get_location_info` instead of hostip.info when set
+location_database = None
+
+_location_cache = LRUCache(10000)
+
+
 def get_location_info(ip):
     """Get an estimated location info give IP address."""
-    cache = getattr(get_location_info, '_cache', {})
+    if location_database is not None:
+        return location_database.lookup(ip) or ('', '')
+
+    cache = _location_cache
     if ip in cache:
         return cache[ip]
 
@@ -45,6 +66,149 @@ def get_location_info(ip):
         return country, city
 
 
+def ip_to_int(ip):
+    """Convert a dotted IPv4 address to an integer."""
+    return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+class IPLocationDB(object):
+    """Offline IPv4 geolocation over a compiled range table.
+
+    `compile` turns a CSV of ``start,end,country,city`` rows, with addresses
+    either dotted or as integers, into a compact binary file of sorted range
+    starts and ends plus a table of distinct locations. Opening that file
+    maps it into memory, so workers share the pages and lookups are a binary
+    search without loading anything up front. Recent results are kept in a
+    bounded LRU cache.
+
+    `lookup` returns ``(country, city)``, or None for unknown addresses.
+    """
+    MAGIC = b'BIPG'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHII')
+
+    def __init__(self, path, cache_size=10000):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, self._location_count = \
+            self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError('Not an IP location file: {0}'.format(path))
+        self._starts = self.HEADER.size
+        self._ends = self._starts + 4 * self._count
+        self._location_ids = self._ends + 4 * self._count
+        self._offsets = self._location_ids + 4 * self._count
+        self._blob = self._offsets + 4 * (self._location_count + 1)
+        self._locations = {}
+        self._cache = LRUCache(cache_size) if cache_size else None
+
+    @classmethod
+    def compile(cls, csv_path, path, **kwargs):
+        """Compile the CSV at `csv_path` into `path` and open it."""
+        ranges = []
+        locations = {}
+        with open(csv_path) as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith('#'):
+                    continue
+                start, end = [int(v) if v.isdigit() else ip_to_int(v)
+                              for v in row[:2]]
+                location = u'\t'.join(
+                    v if isinstance(v, type(u'')) else v.decode('utf-8')
+                    for v in (row[2:4] + ['', ''])[:2])
+                ranges.append((start, end,
+                               locations.setdefault(location, len(locations))))
+        ranges.sort()
+        for previous, current in zip(ranges, ranges[1:]):
+            if current[0] <= previous[1]:
+                raise ValueError('Overlapping IP ranges in {0}'.format(
+                    csv_path))
+
+        blobs = [None] * len(locations)
+        for location, index in locations.items():
+            blobs[index] = location.encode('utf-8')
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        columns = [[r[i] for r in ranges] for i in range(3)]
+        columns.append(offsets)
+        with open(path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(ranges),
+                                    len(locations)))
+            for column in columns:
+                f.write(struct.pack('<{0}I'.format(len(column)), *column))
+            f.write(b''.join(blobs))
+        return cls(path, **kwargs)
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self._count
+
+    def _int(self, offset, index):
+        return struct.unpack_from('<I', self._map, offset + 4 * index)[0]
+
+    def _location(self, index):
+        location = self._locations.get(index)
+        if location is None:
+            start = self._blob + self._int(self._offsets, index)
+            end = self._blob + self._int(self._offsets, index + 1)
+            location = tuple(self._map[start:end].decode('utf-8').split(
+                u'\t'))
+            self._locations[index] = location
+        return location
+
+    def _find(self, number):
+        """Index of the range containing the integer address, or -1."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._int(self._starts, middle) <= number:
+                low = middle + 1
+            else:
+                high = middle
+        index = low - 1
+        if index >= 0 and number <= self._int(self._ends, index):
+            return index
+        return -1
+
+    def lookup(self, ip):
+        cache = self._cache
+        if cache is not None:
+            try:
+                return cache[ip]
+            except KeyError:
+                pass
+        index = self._find(ip_to_int(ip))
+        result = (self._location(self._int(self._location_ids, index))
+                  if index >= 0 else None)
+        if cache is not None:
+            cache[ip] = result
+        return result
+
+    def lookup_many(self, ips):
+        """Look up many addresses at once, in one vectorized search when
+        numpy is available."""
+        if np is None or not self._count:
+            return [self.lookup(ip) for ip in ips]
+        numbers = np.array([ip_to_int(ip) for ip in ips], dtype=np.int64)
+        starts = np.frombuffer(self._map, dtype='<u4', count=self._count,
+                               offset=self._starts)
+        ends = np.frombuffer(self._map, dtype='<u4', count=self._count,
+                             offset=self._ends)
+        location_ids = np.frombuffer(self._map, dtype='<u4',
+                                     count=self._count,
+                                     offset=self._location_ids)
+        indices = np.searchsorted(starts, numbers, side='right') - 1
+        clipped = np.maximum(indices, 0)
+        found = (indices >= 0) & (numbers <= ends[clipped])
+        return [self._location(location) if hit else None
+                for hit, location in zip(found.tolist(),
+                                         location_ids[clipped].tolist())]
+
+
 def haversine(*p):
     """Calculate the great circle distance between two points on the earth
     (specified in decimal degrees)
@@ -83,21 +247,170 @@ def move(source, distance, direction=(1, 1)):
     return map(sum, zip(source, offset))
 
 
+# Vectorized versions (numpy)
+# ---------------------------
+
+# Same radius as `haversine`, in meters
+EARTH_RADIUS = 6367 * 1000
+
+
+def _haversine_arrays(lon1, lat1, lon2, lat2):
+    # Inputs in radians, broadcast against each other
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_many(origin, points):
+    """Distances in meters from one ``(lon, lat)`` to each of ``points``.
+
+    ``points`` is anything convertible to an ``(N, 2)`` array of
+    ``(lon, lat)`` pairs. Returns an array of ``N`` distances.
+    """
+    points = np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+    lon1, lat1 = np.radians(origin[0]), np.radians(origin[1])
+    return _haversine_arrays(lon1, lat1, points[:, 0], points[:, 1])
+
+
+def haversine_pairwise(a, b, chunk_size=2 ** 22):
+    """Matrix of distances in meters between every point of ``a`` and ``b``.
+
+    Rows are computed in chunks so that temporary arrays hold no more than
+    about ``chunk_size`` elements, regardless of ``len(a) * len(b)``.
+    Returns an ``(N, M)`` array.
+    """
+    a = np.radians(np.asarray(a, dtype=float).reshape(-1, 2))
+    b = np.radians(np.asarray(b, dtype=float).reshape(-1, 2))
+    out = np.empty((len(a), len(b)))
+    rows = max(1, chunk_size // max(1, len(b)))
+    lon2, lat2 = b[:, 0][np.newaxis, :], b[:, 1][np.newaxis, :]
+    for start in range(0, len(a), rows):
+        chunk = a[start:start + rows]
+        out[start:start + rows] = _haversine_arrays(
+            chunk[:, 0][:, np.newaxis], chunk[:, 1][:, np.newaxis],
+            lon2, lat2)
+    return out
+
+
+def move_many(sources, distance, direction=(1, 1)):
+    """`move` for an ``(N, 2)`` array of ``(lon, lat)`` sources at once.
+
+    ``distance`` may be a scalar or one value per source, ``direction`` a
+    single ``(dlon, dlat)`` or one per source. Returns an ``(N, 2)`` array.
+    """
+    sources = np.asarray(sources, dtype=float).reshape(-1, 2)
+    direction = np.broadcast_to(
+        np.asarray(direction, dtype=float), sources.shape)
+    pseudo = np.radians(sources + direction)
+    radians_ = np.radians(sources)
+    pseudo_distance = _haversine_arrays(
+        radians_[:, 0], radians_[:, 1], pseudo[:, 0], pseudo[:, 1])
+    scale = np.asarray(distance, dtype=float) / pseudo_distance
+    return sources + direction * scale[:, np.newaxis]
+
+
+def bounding_boxes(location, radius):
+    """Lon/lat boxes ``(min_lon, min_lat, max_lon, max_lat)`` covering every
+    point within ``radius`` meters of ``location``.
+
+    Usually a single box; two when it crosses the antimeridian, and a full
+    band of longitudes when it reaches a pole.
+    """
+    lon, lat = location[0], location[1]
+    angle = radius / float(EARTH_RADIUS)
+    if angle >= pi:
+        return [(-180.0, -90.0, 180.0, 90.0)]
+    dlat = degrees(angle)
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    ratio = sin(angle) / cos(radians(lat))
+    if min_lat <= -90.0 or max_lat >= 90.0 or ratio >= 1:
+        return [(-180.0, min_lat, 180.0, max_lat)]
+    dlon = degrees(asin(ratio))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180.0:
+        return [(min_lon + 360.0, min_lat, 180.0, max_lat),
+                (-180.0, min_lat, max_lon, max_lat)]
+    if max_lon > 180.0:
+        return [(min_lon, min_lat, 180.0, max_lat),
+                (-180.0, min_lat, max_lon - 360.0, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+
 class Rtree2D(object):
     """Wrapper of `rtree.Index` for supporting friendly 2d operations.
 
     Also forces the uniqueness of the `id` parameter, which is different from
     the rtree module's behavior.
+
+    With a `path` the index is kept on disk in ``path.dat`` / ``path.idx``
+    and an existing index there is opened, so a prebuilt index can be shared
+    instead of rebuilt by every worker.
     """
+    WORLD = (-180.0, -90.0, 180.0, 90.0)
 
-    def __init__(self):
-        self._index = Rtree()
+    def __init__(self, path=None):
+        self.path = path
+        self._index = Rtree(path) if path is not None else Rtree()
         self._locations = {}
+        if path is not None and len(self._index):
+            for item in self._index.intersection(self.WORLD, objects=True):
+                self._locations[item.id] = tuple(item.bbox[:2])
+
+    @classmethod
+    def load(cls, path):
+        return cls(path)
 
     @staticmethod
     def to_coords(location):
         return (location[0], location[1], location[0], location[1])
 
+    @staticmethod
+    def _create(path, stream=None):
+        if path is None:
+            return Rtree(stream) if stream else Rtree()
+        # Start from fresh files; rtree's `overwrite` property doesn't reset
+        # an index that has been opened before.
+        for extension in ('.dat', '.idx'):
+            if os.path.exists(path + extension):
+                os.remove(path + extension)
+        return Rtree(path, stream) if stream else Rtree(path)
+
+    def bulk_load(self, items):
+        """Add many ``(id, location)`` or ``(id, location, obj)`` items.
+
+        An empty index is packed in one go with rtree's stream loading,
+        which is much faster than inserting point by point and yields a
+        better balanced tree. Otherwise the items are `set` one by one.
+        """
+        if self._locations:
+            for item in items:
+                self.set(*item)
+            return
+        latest = {}
+        for item in items:
+            latest[item[0]] = item
+        if not latest:
+            return
+        self._index.close()
+        self._index = self._create(self.path, (
+            (item[0], self.to_coords(item[1]),
+             item[2] if len(item) > 2 else None)
+            for item in latest.values()))
+        self._locations = dict((id, item[1]) for id, item in latest.items())
+
+    def save(self, path):
+        """Write a packed copy of the index to ``path.dat`` / ``path.idx``,
+        to be opened with `load`."""
+        stream = ((item.id, item.bbox, item.object) for item in
+                  self._index.intersection(self.WORLD, objects=True))
+        self._create(path, stream if self._locations else None).close()
+
+    def flush(self):
+        self._index.flush()
+
+    def close(self):
+        self._index.close()
+
     def keys(self):
         return self._locations.keys()
 
@@ -117,10 +430,302 @@ class Rtree2D(object):
         self._index.delete(id, self.to_coords(self._locations[id]))
         del self._locations[id]
 
+    def _by_distance(self, location, ids):
+        """``(distance, id)`` for each of ``ids``, nearest first."""
+        if np is None:
+            distances = [haversine(self._locations[id_][:2], location[:2])
+                         for id_ in ids]
+        else:
+            coords = np.radians([self._locations[id_][:2] for id_ in ids])
+            distances = _haversine_arrays(
+                np.radians(location[0]), np.radians(location[1]),
+                coords[:, 0], coords[:, 1]).tolist()
+        order = sorted(range(len(ids)), key=distances.__getitem__)
+        return [(distances[i], ids[i]) for i in order]
+
+    def within(self, location, radius, objects=False):
+        """Ids (or objects) of all points within ``radius`` meters of
+        ``location``, nearest first.
+
+        The rtree is searched with the bounding boxes of the radius and the
+        candidates are refined by their great-circle distance.
+        """
+        found = {}
+        for box in bounding_boxes(location, radius):
+            for item in self._index.intersection(box, objects=objects):
+                if objects:
+                    found[item.id] = item.object
+                else:
+                    found[item] = item
+        if not found:
+            return []
+        return [found[id_]
+                for distance_, id_ in self._by_distance(location, list(found))
+                if distance_ <= radius]
+
+    def nearest(self, location, count=1, objects=False, max_distance=None):
+        coords = self.to_coords(location)
+        if max_distance is None:
+            return list(self._index.nearest(coords, num_results=count,
+                                            objects=objects))
+        # rtree ranks by planar distance in degrees, which can disagree with
+        # the great-circle distance. Ask it for more candidates until the
+        # next ones can't be closer than the `count` nearest found so far.
+        wanted = count
+        while True:
+            items = list(self._index.nearest(coords, num_results=wanted,
+                                             objects=objects))
+            found = dict((item.id, item.object) if objects else (item, item)
+                         for item in items)
+            ranked = [(distance_, id_) for distance_, id_
+                      in self._by_distance(location, list(found))
+                      if distance_ <= max_distance][:count]
+            if len(items) < wanted:
+                break
+            radius = ranked[-1][0] if len(ranked) == count else max_distance
+            last = self._locations[items[-1].id if objects else items[-1]]
+            if self._planar_distance(location, last) > \
+                    self._planar_reach(location, radius):
+                break
+            wanted *= 2
+        return [found[id_] for _, id_ in ranked]
+
+    @staticmethod
+    def _planar_distance(a, b):
+        return hypot(a[0] - b[0], a[1] - b[1])
+
+    @classmethod
+    def _planar_reach(cls, location, radius):
+        # Planar distance beyond which no point is within `radius` meters
+        return max(cls._planar_distance(location, corner)
+                   for box in bounding_boxes(location, radius)
+                   for corner in ((box[0], box[1]), (box[0], box[3]),
+                                  (box[2], box[1]), (box[2], box[3])))
+
+
+class GridIndex2D(object):
+    """Pure numpy alternative to `Rtree2D`, for when rtree is unavailable.
+
+    Points are bucketed into fixed ``cell_size`` degree lon/lat cells, like
+    geohash prefixes, and their coordinates kept in flat numpy arrays.
+    Queries collect the cells overlapping the bounding box of a great-circle
+    radius and refine the candidates with vectorized haversine, so distances
+    are true great-circle distances in meters, not planar ones.
+
+    Offers the `set` / `remove` / `get` / `nearest` interface of `Rtree2D`
+    plus `within` for radius queries and `bulk_load` for building from many
+    points at once.
+    """
+
+    def __init__(self, cell_size=0.1):
+        self.cell_size = float(cell_size)
+        self._lon_cells = int(np.ceil(360.0 / self.cell_size))
+        self._cells = {}
+        self._slots = {}
+        self._ids = []
+        self._objects = []
+        self._free = []
+        self._coords = np.empty((0, 2))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, id):
+        return id in self._slots
+
+    def keys(self):
+        return self._slots.keys()
+
+    def get(self, id, objects=False):
+        slot = self._slots.get(id)
+        if slot is None:
+            return None
+        if objects:
+            return self._objects[slot]
+        return tuple(self._coords[slot])
+
+    def _cell(self, lon, lat):
+        lat_index = int(np.floor((lat + 90.0) / self.cell_size))
+        lon_index = int(np.floor((lon + 180.0) / self.cell_size))
+        return lat_index * self._lon_cells + lon_index % self._lon_cells
+
+    def _reserve(self, count):
+        # Grow the coordinate array geometrically
+        needed = len(self._ids) + count
+        if needed > len(self._coords):
+            coords = np.empty((max(needed, 2 * len(self._coords), 16), 2))
+            coords[:len(self._coords)] = self._coords
+            self._coords = coords
+
+    def _allocate(self, id, obj):
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = id
+            self._objects[slot] = obj
+        else:
+            self._reserve(1)
+            slot = len(self._ids)
+            self._ids.append(id)
+            self._objects.append(obj)
+        self._slots[id] = slot
+        return slot
+
+    def set(self, id, location, obj=None):
+        if id in self._slots:
+            self.remove(id)
+        slot = self._allocate(id, obj)
+        self._coords[slot] = location[0], location[1]
+        self._cells.setdefault(
+            self._cell(location[0], location[1]), []).append(slot)
+
+    def remove(self, id):
+        slot = self._slots.pop(id)
+        lon, lat = self._coords[slot]
+        cell = self._cell(lon, lat)
+        slots = self._cells[cell]
+        slots.remove(slot)
+        if not slots:
+            del self._cells[cell]
+        self._ids[slot] = self._objects[slot] = None
+        self._free.append(slot)
+
+    def bulk_load(self, items):
+        """Add many ``(id, location)`` or ``(id, location, obj)`` items.
+
+        Cells are computed for all points in one vectorized pass, which is
+        much faster than calling `set` for each of them.
+        """
+        latest = {}
+        for item in items:
+            latest[item[0]] = item
+        for id in latest:
+            if id in self._slots:
+                self.remove(id)
+        if not latest:
+            return
+        items = list(latest.values())
+        self._reserve(len(items))
+        start = len(self._ids)
+        end = start + len(items)
+        coords = np.array([item[1][:2] for item in items], dtype=float)
+        self._coords[start:end] = coords
+        self._ids.extend(latest)
+        self._objects.extend(item[2] if len(item) > 2 else None
+                             for item in items)
+        self._slots.update(zip(latest, range(start, end)))
+
+        lat_index = np.floor((coords[:, 1] + 90.0) / self.cell_size)
+        lon_index = np.floor((coords[:, 0] + 180.0) / self.cell_size)
+        cells = (lat_index.astype(np.int64) * self._lon_cells +
+                 lon_index.astype(np.int64) % self._lon_cells)
+        setdefault = self._cells.setdefault
+        for cell, slot in zip(cells.tolist(), range(start, end)):
+            setdefault(cell, []).append(slot)
+
+    def save(self, path):
+        """Write the points to a numpy ``.npz`` file, to be opened with
+        `load`."""
+        slots = sorted(self._slots.values())
+        ids = np.empty(len(slots), dtype=object)
+        ids[:] = [self._ids[slot] for slot in slots]
+        objects = np.empty(len(slots), dtype=object)
+        objects[:] = [self._objects[slot] for slot in slots]
+        with open(path, 'wb') as f:
+            np.savez(f, cell_size=self.cell_size, coords=self._coords[slots],
+                     ids=ids, objects=objects)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=True) as data:
+            index = cls(cell_size=float(data['cell_size']))
+            index.bulk_load(zip(data['ids'].tolist(),
+                                data['coords'].tolist(),
+                                data['objects'].tolist()))
+        return index
+
+    def _candidates(self, location, radius):
+        """Slots of every point possibly within ``radius`` meters."""
+        ranges = []
+        for min_lon, min_lat, max_lon, max_lat in bounding_boxes(location,
+                                                                 radius):
+            first_lat = int(np.floor((min_lat + 90.0) / self.cell_size))
+            last_lat = int(np.floor((max_lat + 90.0) / self.cell_size))
+            first_lon = int(np.floor((min_lon + 180.0) / self.cell_size))
+            last_lon = int(np.floor((max_lon + 180.0) / self.cell_size))
+            ranges.append((first_lat, last_lat, first_lon,
+                           min(last_lon - first_lon + 1, self._lon_cells)))
+
+        cells = self._cells
+        if sum((last_lat - first_lat + 1) * lon_count
+               for first_lat, last_lat, _, lon_count in ranges) > len(cells):
+            # Fewer occupied cells than cells in the boxes: filter those
+            result = []
+            for cell, slots in cells.items():
+                lat_index, lon_index = divmod(cell, self._lon_cells)
+                for first_lat, last_lat, first_lon, lon_count in ranges:
+                    if (first_lat <= lat_index <= last_lat and
+                            (lon_index - first_lon) % self._lon_cells <
+                            lon_count):
+                        result.extend(slots)
+                        break
+            return result
+        seen = set()
+        result = []
+        for first_lat, last_lat, first_lon, lon_count in ranges:
+            for lat_index in range(first_lat, last_lat + 1):
+                row = lat_index * self._lon_cells
+                for lon_index in range(first_lon, first_lon + lon_count):
+                    cell = row + lon_index % self._lon_cells
+                    slots = cells.get(cell)
+                    if slots and cell not in seen:
+                        seen.add(cell)
+                        result.extend(slots)
+        return result
+
+    def _query(self, location, radius):
+        """Return ``(slots, distances)`` within ``radius``, nearest first."""
+        slots = np.array(self._candidates(location, radius), dtype=np.int64)
+        if not len(slots):
+            return slots, np.empty(0)
+        coords = np.radians(self._coords[slots])
+        distances = _haversine_arrays(
+            np.radians(location[0]), np.radians(location[1]),
+            coords[:, 0], coords[:, 1])
+        inside = distances <= radius
+        slots, distances = slots[inside], distances[inside]
+        order = np.argsort(distances, kind='mergesort')
+        return slots[order], distances[order]
+
+    def _results(self, slots, objects):
+        if objects:
+            return [self._objects[slot] for slot in slots]
+        return [self._ids[slot] for slot in slots]
+
+    def within(self, location, radius, objects=False):
+        """Ids (or objects) of all points within ``radius`` meters of
+        ``location``, nearest first."""
+        slots, _ = self._query(location, radius)
+        return self._results(slots, objects)
+
     def nearest(self, location, count=1, objects=False, max_distance=None):
-        ids = self._index.nearest(self.to_coords(location), num_results=count,
-                                  objects=objects)
+        """The ``count`` points nearest to ``location`` by great-circle
+        distance, optionally no farther than ``max_distance`` meters.
+
+        Searches a radius of one cell first and doubles it until enough
+        points are found inside it, so the result is exact.
+        """
+        if not self._slots or count <= 0:
+            return []
+        limit = np.pi * EARTH_RADIUS
         if max_distance is not None:
-            ids = [id_ for id_ in ids
-                   if distance(self._locations[id_], location) <= max_distance]
-        return ids
+            limit = min(limit, max_distance)
+        radius = min(limit, np.radians(self.cell_size) * EARTH_RADIUS)
+        while True:
+            slots, _ = self._query(location, radius)
+            if len(slots) >= count or radius >= limit:
+                return self._results(slots[:count], objects)
+            radius = min(limit, radius * 2)
+
+
+# Spatial index to use: rtree when installed, the numpy grid otherwise
+GeoIndex = Rtree2D if Rtree is not None else GridIndex2D
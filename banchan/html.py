@@ -1,5 +1,222 @@
 import re
+import unicodedata
+
+
+re_words = re.compile(r'<.*?>|((?:\w[-\w]*|&.*?;)+)', re.U | re.S)
+re_tag = re.compile(r'<(/)?([^ ]+?)(?:(\s*/)| .*?)?>', re.S)
+
+html4_singlets = (
+    'br', 'col', 'link', 'base', 'img',
+    'param', 'area', 'hr', 'input'
+)
 
 
 def strip_tags(s):
     return re.sub(r'<[^>]*?>', '', s)
+
+
+def truncate_len(length, ending):
+    """Return how many chars of text fit before ``ending`` in ``length``,
+    not counting combining characters."""
+    for char in ending:
+        if not unicodedata.combining(char):
+            length -= 1
+            if length == 0:
+                break
+    return length
+
+
+def truncate_html(chunks, length, ending=u'...', words=False, max_text=None):
+    """Truncate HTML given as an iterable of text chunks to ``length`` chars
+    of text, not counting tags and comments, or to ``length`` words if
+    ``words`` is True. Truncated output ends in ``ending`` and closes the tags
+    left open, if they were correctly closed in the given HTML; it keeps at
+    most ``max_text`` chars of text, by default `truncate_len` of ``length``
+    and ``ending``, so that with ``ending`` it fits ``length``.
+
+    Chunks are read in a single pass and not past the truncate point.
+    Newlines are preserved.
+    """
+    if words:
+        if length <= 0:
+            return ''
+        return _truncate_html_words(chunks, length, ending)
+    if max_text is None:
+        max_text = truncate_len(length, ending)
+    return _truncate_html_chars(chunks, length, ending, max_text)
+
+
+def _truncate_html_chars(chunks, length, ending, max_text):
+    """Character mode of `truncate_html`, counting the characters of whole
+    text runs at once."""
+    consumed = []
+    buf = ''
+    base = 0  # Offset of buf in the consumed text
+    pos = 0
+    end_text_pos = 0
+    current_len = 0
+    # Innermost open tag last
+    open_tags = []
+
+    chunks = iter(chunks)
+    eof = False
+    while not eof:
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            consumed.append(chunk)
+            base += pos
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        while pos < len(buf):
+            lt = buf.find('<', pos)
+            gt = buf.find('>', lt) if lt >= 0 else -1
+            if gt >= 0:
+                run_end = lt
+            elif eof:
+                # A '<' that never closes is plain text
+                run_end = len(buf)
+            else:
+                run_end = lt if lt >= 0 else len(buf)
+
+            # Count the chars of the text run
+            count = run_end - pos
+            if current_len < max_text <= current_len + count:
+                end_text_pos = base + pos + max_text - current_len
+            if current_len + count > length:
+                # Found the truncate point
+                current_len += count
+                break
+            current_len += count
+            pos = run_end
+            if gt < 0:
+                # Wait for the rest of the tag
+                break
+
+            pos = gt + 1
+            if current_len < max_text:
+                _handle_tag(re_tag.match(buf, lt, pos), open_tags)
+        if current_len > length:
+            break
+
+    return _finish_truncate_html(consumed, length, ending, current_len,
+                                 end_text_pos, open_tags)
+
+
+def _truncate_html_words(chunks, length, ending):
+    """Word mode of `truncate_html`.
+
+    Words and tags are matched with re_words just like in a single string,
+    where an entity-like ``&...;`` may run on over spaces and tags. A match
+    is only used once later chunks can't change it: when no '&' lacking a
+    ';' or '<' lacking a '>' comes before it, and it doesn't end where more
+    text could extend it.
+    """
+    consumed = []
+    buf = ''
+    base = 0  # Offset of buf in the consumed text
+    pos = 0
+    end_text_pos = 0
+    current_len = 0
+    # Innermost open tag last
+    open_tags = []
+    # Character the next chunk must contain before matching can go on
+    need = None
+
+    chunks = iter(chunks)
+    eof = False
+    while not eof and current_len <= length:
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        elif need is not None and need not in chunk:
+            consumed.append(chunk)
+            buf += chunk
+            continue
+        else:
+            consumed.append(chunk)
+            base += pos
+            buf = buf[pos:] + chunk
+            pos = 0
+        need = None
+
+        # Matches ending before limit are final; past it they are checked
+        limit = len(buf) if eof else -1
+        for m in re_words.finditer(buf, pos):
+            if m.end() >= limit and not eof:
+                if pos > limit:
+                    semi, limit = _open_limit(buf, pos)
+                if m.start() > limit:
+                    break
+                end = m.end()
+                if m.group(1) and (end == len(buf) or
+                                   end > semi and buf[end] == '&'):
+                    # The word may go on in the next chunk
+                    pos = m.start()
+                    break
+            pos = m.end()
+            if m.group(1):
+                current_len += 1
+                if current_len == length:
+                    end_text_pos = base + pos
+                elif current_len > length:
+                    break
+            elif current_len < length:
+                _handle_tag(re_tag.match(m.group(0)), open_tags)
+        else:
+            m = None
+        if not eof and (m is None or m.start() > limit):
+            if pos > limit:
+                semi, limit = _open_limit(buf, pos)
+            if limit < len(buf):
+                need = ';' if buf[limit] == '&' else '>'
+            pos = limit
+
+    return _finish_truncate_html(consumed, length, ending, current_len,
+                                 end_text_pos, open_tags)
+
+
+def _open_limit(buf, pos):
+    """Return the offset of the last ';' in buf and the first offset from pos
+    at which re_words may match differently once more text follows: the
+    first '&' lacking a ';' or '<' lacking a '>' after it, else the end of
+    buf."""
+    semi = buf.rfind(';')
+    amp = buf.find('&', max(pos, semi + 1))
+    lt = buf.find('<', max(pos, buf.rfind('>') + 1))
+    return semi, min(i for i in (amp, lt, len(buf)) if i >= 0)
+
+
+def _handle_tag(tag, open_tags):
+    """Track the tags left open by tag, a re_tag match or None, in open_tags,
+    innermost last."""
+    if not tag:
+        return
+    closing_tag, tagname, self_closing = tag.groups()
+    # Element names are always case-insensitive
+    tagname = tagname.lower()
+    if self_closing or tagname in html4_singlets:
+        pass
+    elif closing_tag:
+        # SGML: An end tag closes, back to the matching start tag,
+        # all unclosed intervening start tags with omitted end tags
+        for i in range(len(open_tags) - 1, -1, -1):
+            if open_tags[i] == tagname:
+                del open_tags[i:]
+                break
+    else:
+        open_tags.append(tagname)
+
+
+def _finish_truncate_html(consumed, length, ending, current_len,
+                          end_text_pos, open_tags):
+    text = ''.join(consumed)
+    if current_len <= length:
+        return text
+    out = text[:end_text_pos] + ending
+    # Close any tags still open
+    for tag in reversed(open_tags):
+        out += '</%s>' % tag
+    return out
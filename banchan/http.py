@@ -33,6 +33,7 @@ def retry_url(url, retry_on_404=True, num_retries=10, timeout=None):
     return ''
 
 
+from .ds import HTTPHeaders
 from .structures import LookupDict
 
 _codes = {
@@ -187,7 +188,7 @@ def parse_multipart_form_data(boundary, data, arguments, files):
         if eoh == -1:
             gen_log.warning("multipart/form-data missing headers")
             continue
-        headers = HTTPHeaders.parse(part[:eoh].decode("utf-8"))
+        headers = HTTPHeaders.parse(part[:eoh], encoding="utf-8")
         disp_header = headers.get("Content-Disposition", "")
         disposition, disp_params = _parse_header(disp_header)
         if disposition != "form-data" or not part.endswith(b"\r\n"):
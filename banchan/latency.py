@@ -0,0 +1,106 @@
+import threading
+import timeit
+
+
+class LatencyRecorder(object):
+    """Per-callable call count, cumulative time and latency histogram.
+
+    Meant to be handed to `dispatch.Signal.instrument` or
+    `emit.EmitterMixin.instrument`, which then route every receiver or
+    callback invocation through `call`, or time it themselves and pass the
+    result to `record` when it has to be awaited.
+
+    Every callable gets its own row, keyed by identity like the dispatcher
+    keys receivers: bound methods of two instances, or two lambdas, are
+    reported apart. The dotted name of the callable is kept as the row's
+    label; no references to the callables themselves are kept, so a key may
+    be reused once its callable has been garbage collected.
+
+    The histogram has one bucket per power of two microseconds, bucket ``i``
+    counting calls that took less than ``2 ** i`` microseconds.
+    """
+    timer = staticmethod(timeit.default_timer)
+    BUCKETS = 32
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def key(func):
+        if hasattr(func, '__func__'):
+            return (id(func.__self__), id(func.__func__))
+        return id(func)
+
+    @staticmethod
+    def name(func):
+        owner = getattr(func, '__self__', None)
+        func = getattr(func, '__func__', func)
+        name = getattr(func, '__qualname__', None) or \
+            getattr(func, '__name__', None) or repr(func)
+        if owner is not None and '.' not in name:
+            name = '{0}.{1}'.format(type(owner).__name__, name)
+        return '{0}.{1}'.format(getattr(func, '__module__', None), name)
+
+    def call(self, func, *args, **kwargs):
+        start = self.timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(func, self.timer() - start)
+
+    def record(self, func, elapsed):
+        key = self.key(func)
+        bucket = min(int(elapsed * 1e6).bit_length(), self.BUCKETS - 1)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [
+                    self.name(func), 0, 0.0, 0.0, [0] * self.BUCKETS]
+            stats[1] += 1
+            stats[2] += elapsed
+            if elapsed > stats[3]:
+                stats[3] = elapsed
+            stats[4][bucket] += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    @staticmethod
+    def _percentile(histogram, count, fraction):
+        # Upper bound of the bucket holding the percentile, in seconds
+        threshold = count * fraction
+        seen = 0
+        for i, n in enumerate(histogram):
+            seen += n
+            if seen >= threshold:
+                return (2 ** i) / 1e6
+        return (2 ** (len(histogram) - 1)) / 1e6
+
+    def report(self):
+        """Return one dict per callable, slowest cumulative time first.
+
+        Each has the ``key`` identifying the callable and its ``name``,
+        ``count``, ``total``, ``average`` and ``max`` (seconds), ``p50``/
+        ``p99`` upper bounds taken from the histogram, and the raw
+        ``histogram``.
+        """
+        with self._lock:
+            items = [(key, list(stats[:4]) + [list(stats[4])])
+                     for key, stats in self._stats.items()]
+        rows = []
+        for key, (name, count, total, max_, histogram) in items:
+            rows.append({
+                'key': key,
+                'name': name,
+                'count': count,
+                'total': total,
+                'average': total / count,
+                'max': max_,
+                'p50': self._percentile(histogram, count, 0.5),
+                'p99': self._percentile(histogram, count, 0.99),
+                'histogram': histogram,
+            })
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
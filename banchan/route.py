@@ -1,15 +1,197 @@
 import re
+import threading
 
+from .cache import LRUCache
 from .log import LogMixin
 from .url import get_url_path
 
 
+# Characters that end the literal prefix of a pattern
+_SPECIAL_CHARS = frozenset('.^$*+?{}[]\\|()')
+_QUANTIFIERS = frozenset('*?{')
+# Named and numbered backreferences, conditional groups and inline flags
+# can't be merged into a shared alternation
+_UNMERGEABLE = re.compile(r'\(\?P=|\\[1-9]|\(\?\(|^\(\?[aiLmsux]+\)')
+_GROUP_NAME = re.compile(r'\(\?P<([A-Za-z_][A-Za-z0-9_]*)>')
+
+
+def literal_prefix(pattern):
+    """Return the literal text every match of `pattern` must start with."""
+    if '|' in pattern:
+        # A top-level alternation may start with anything
+        return ''
+    chars = []
+    i = 1 if pattern.startswith('^') else 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if not escaped or escaped.isalnum():
+                break
+            char = escaped
+            i += 2
+        elif char in _SPECIAL_CHARS:
+            break
+        else:
+            i += 1
+        if pattern[i:i + 1] and pattern[i] in _QUANTIFIERS:
+            # The character just read is optional or repeated
+            break
+        chars.append(char)
+    return ''.join(chars)
+
+
+class _RouteNode(object):
+    __slots__ = ('children', 'routes', 'plan')
+
+    def __init__(self):
+        self.children = {}
+        # Indices of the routes whose literal prefix ends here
+        self.routes = []
+        self.plan = None
+
+
+class CompiledRouter(object):
+    """Matches paths against an ordered list of ``(pattern, handler)`` routes
+    with the same result as trying each ``re.match`` in turn.
+
+    The literal prefix of every pattern goes into a character trie, so only
+    the routes whose prefix the path starts with are considered at all. Those
+    candidates are merged into a single alternation regex, one per trie node,
+    whose first matching branch is found by ``re`` in one call; the named
+    group of that branch tells which route it was. Patterns using
+    backreferences, conditional groups or inline flags, and precompiled
+    patterns carrying flags or bytes, are matched on their own, in order.
+
+    Recent results are kept in a bounded LRU cache keyed by path, shared by
+    all threads behind a lock.
+    """
+    # Python 2 caps a regex at 100 groups
+    max_groups = 99
+
+    def __init__(self, routes, cache_size=10000):
+        self.routes = [(re.compile(pattern), handler)
+                       for pattern, handler in routes]
+        # The source of each pattern that can share an alternation, or None
+        # for one that has to be matched alone with its own compiled regex
+        self._patterns = [self._mergeable_source(compiled)
+                          for compiled, _ in self.routes]
+        self._root = _RouteNode()
+        for index, pattern in enumerate(self._patterns):
+            node = self._root
+            for char in literal_prefix(pattern) if pattern else '':
+                node = node.children.setdefault(char, _RouteNode())
+            node.routes.append(index)
+        self._cache = LRUCache(cache_size) if cache_size else None
+        self._cache_lock = threading.Lock()
+
+    @staticmethod
+    def _mergeable_source(compiled):
+        source = compiled.pattern
+        if isinstance(source, bytes) and bytes is not str:
+            # Python 3 bytes patterns can't share a str alternation
+            return None
+        # Flags passed to re.compile() rather than written in the pattern
+        # would be lost, and may make the literal prefix case-insensitive
+        if compiled.flags != re.compile(source).flags:
+            return None
+        if _UNMERGEABLE.search(source):
+            return None
+        return source
+
+    def _compile_plan(self, indices):
+        """Turn sorted route indices into steps tried in order: either
+        ``(regex, {branch: (route index, {name: group})}, None)`` for a
+        merged run, or ``(regex, None, route index)`` for a pattern matched
+        alone."""
+        plan = []
+        branches, names, groups = [], {}, 0
+        for index in indices:
+            pattern = self._patterns[index]
+            compiled = self.routes[index][0]
+            if pattern is None:
+                if branches:
+                    plan.append(self._merge(branches, names))
+                    branches, names, groups = [], {}, 0
+                plan.append((compiled, None, index))
+                continue
+            if branches and groups + compiled.groups + 1 > self.max_groups:
+                plan.append(self._merge(branches, names))
+                branches, names, groups = [], {}, 0
+            renamed = {}
+
+            def rename(match):
+                name = '_r{0}_{1}'.format(index, match.group(1))
+                renamed[match.group(1)] = name
+                return '(?P<{0}>'.format(name)
+            branch = '_r{0}'.format(index)
+            branches.append('(?P<{0}>{1})'.format(
+                branch, _GROUP_NAME.sub(rename, pattern)))
+            names[branch] = (index, renamed)
+            groups += compiled.groups + 1
+        if branches:
+            plan.append(self._merge(branches, names))
+        return plan
+
+    @staticmethod
+    def _merge(branches, names):
+        return re.compile('|'.join(branches)), names, None
+
+    def _plan_for(self, path):
+        # The deepest trie node with routes on the path decides the
+        # candidates; its plan covers its ancestors' routes too.
+        node = self._root
+        best = node
+        indices = list(node.routes)
+        for char in path:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.routes:
+                best = node
+                indices.extend(node.routes)
+        if best.plan is None:
+            best.plan = self._compile_plan(sorted(indices))
+        return best.plan
+
+    def match(self, path):
+        """Return ``(handler, groupdict)`` of the first matching route, or
+        ``(None, None)``."""
+        cache = self._cache
+        if cache is not None:
+            with self._cache_lock:
+                result = cache[path] if path in cache else None
+            if result is not None:
+                handler, groups = result
+                return handler, groups and dict(groups)
+        handler, groups = self._match(path)
+        if cache is not None:
+            with self._cache_lock:
+                cache[path] = (handler, groups)
+            groups = groups and dict(groups)
+        return handler, groups
+
+    def _match(self, path):
+        for regex, names, index in self._plan_for(path):
+            match = regex.match(path)
+            if match is None:
+                continue
+            if names is None:
+                return self.routes[index][1], match.groupdict()
+            index, renamed = names[match.lastgroup]
+            return self.routes[index][1], dict(
+                (name, match.group(group)) for name, group in renamed.items())
+        return None, None
+
+
 class RouteMixin(LogMixin):
     routes = ()
+    route_cache_size = 10000
 
     def __init__(self):
         super(RouteMixin, self).__init__()
         self._compiled_routes = None
+        self._router = None
 
     @staticmethod
     def get_url_path(url):
@@ -23,13 +205,15 @@ class RouteMixin(LogMixin):
                 for pattern, handler in self.routes]
         return self._compiled_routes
 
+    @property
+    def router(self):
+        if self._router is None:
+            self._router = CompiledRouter(self.routes,
+                                          cache_size=self.route_cache_size)
+        return self._router
+
     def _get_route(self, url):
-        path = self.get_url_path(url)
-        for pattern, handler in self.compiled_routes:
-            match = pattern.match(path)
-            if match:
-                return handler, match.groupdict()
-        return None, None
+        return self.router.match(self.get_url_path(url))
 
     def is_routable(self, url):
         return bool(self._get_route(url)[0])
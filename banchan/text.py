@@ -1,4 +1,8 @@
+from __future__ import absolute_import, unicode_literals
+
+import codecs
 import collections
+import re
 
 
 def strip_tags(s):
@@ -6,8 +10,115 @@ def strip_tags(s):
 
 
 def extract_urls(s):
-    return re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%['
-                      r'0-9a-fA-F][0-9a-fA-F]))+', s)
+    return _url_re.findall(s)
+
+
+_url_re = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|'
+                     r'(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+
+
+class HTMLTokenizer(object):
+    """Incremental HTML tokenizer over text or byte chunks.
+
+    `feed` a chunk at a time, then `close`; both return a list of
+    ``(kind, value)`` events:
+
+    - ``('text', text)`` for text between tags
+    - ``('tag', markup)`` for tags, comments and the like
+    - ``('url', url)`` for URLs anywhere in the markup
+
+    Tags and URLs are found exactly like `strip_tags` and `extract_urls`
+    would on the whole document, even when split across chunks. Only an
+    unfinished tag or URL is kept between chunks, so memory is bounded by
+    the chunk size; a ``<`` not closed within ``max_tag_size`` characters
+    is given up on as text. Byte chunks are decoded with ``encoding``.
+    """
+    max_tag_size = 65536
+
+    def __init__(self, encoding='utf-8', text=True, tags=True, urls=True):
+        self.encoding = encoding
+        self.text = text
+        self.tags = tags
+        self.urls = urls
+        self._decoder = None
+        self._markup = ''
+        self._url_tail = ''
+
+    def feed(self, chunk):
+        if isinstance(chunk, bytes):
+            if self._decoder is None:
+                self._decoder = codecs.getincrementaldecoder(
+                    self.encoding)('replace')
+            chunk = self._decoder.decode(chunk)
+        return self._tokenize(chunk, False)
+
+    def close(self):
+        chunk = self._decoder.decode(b'', True) if self._decoder else ''
+        return self._tokenize(chunk, True)
+
+    def _tokenize(self, chunk, final):
+        events = []
+        if self.text or self.tags:
+            self._split_tags(chunk, final, events)
+        if self.urls:
+            self._find_urls(chunk, final, events)
+        return events
+
+    def _split_tags(self, chunk, final, events):
+        markup = self._markup + chunk
+        pos = 0
+        while True:
+            lt = markup.find('<', pos)
+            gt = markup.find('>', lt + 1) if lt >= 0 else -1
+            if gt < 0:
+                break
+            if self.text and lt > pos:
+                events.append(('text', markup[pos:lt]))
+            if self.tags:
+                events.append(('tag', markup[lt:gt + 1]))
+            pos = gt + 1
+        if lt < 0 or final or len(markup) - lt > self.max_tag_size:
+            lt = len(markup)
+        if self.text and lt > pos:
+            events.append(('text', markup[pos:lt]))
+        self._markup = markup[lt:]
+
+    def _find_urls(self, chunk, final, events):
+        markup = self._url_tail + chunk
+        end = 0
+        for match in _url_re.finditer(markup):
+            if match.end() == len(markup) and not final:
+                # The URL may go on in the next chunk
+                self._url_tail = markup[match.start():]
+                return
+            events.append(('url', match.group(0)))
+            end = match.end()
+        # Keep what may be the start of a URL, up to 'https://'
+        self._url_tail = '' if final else markup[max(end, len(markup) - 8):]
+
+    def tokenize(self, chunks):
+        """Yield the events of an iterable of chunks."""
+        for chunk in chunks:
+            for event in self.feed(chunk):
+                yield event
+        for event in self.close():
+            yield event
+
+
+def strip_tags_stream(chunks, encoding='utf-8'):
+    """Like `strip_tags`, for an iterable of text or byte chunks; yields
+    text."""
+    tokenizer = HTMLTokenizer(encoding, tags=False, urls=False)
+    for _, text in tokenizer.tokenize(chunks):
+        yield text
+
+
+def extract_urls_stream(chunks, encoding='utf-8'):
+    """Like `extract_urls`, for an iterable of text or byte chunks; yields
+    URLs."""
+    tokenizer = HTMLTokenizer(encoding, text=False, tags=False)
+    for _, url in tokenizer.tokenize(chunks):
+        yield url
 
 
 def convert_to_byte(data, encoding='utf-8'):
@@ -184,8 +295,6 @@ def pretty_name(name):
     return name.replace('_', ' ').capitalize()
 
 
-from __future__ import unicode_literals
-
 import re
 import unicodedata
 from gzip import GzipFile
@@ -198,6 +307,11 @@ from django.utils.safestring import SafeText, mark_safe
 from django.utils.six.moves import html_entities
 from django.utils.translation import pgettext, ugettext as _, ugettext_lazy
 
+from .compress import compress_parallel, compress_stream
+from .html import truncate_html, truncate_len
+# The truncation regexes used to live here
+from .html import re_tag, re_words  # NOQA
+
 if six.PY2:
     # Import force_unicode even though this module doesn't use it, because some
     # people rely on it being here.
@@ -209,9 +323,7 @@ capfirst = lambda x: x and force_text(x)[0].upper() + force_text(x)[1:]
 capfirst = allow_lazy(capfirst, six.text_type)
 
 # Set up regular expressions
-re_words = re.compile(r'<.*?>|((?:\w[-\w]*|&.*?;)+)', re.U | re.S)
 re_chars = re.compile(r'<.*?>|(.)', re.U | re.S)
-re_tag = re.compile(r'<(/)?([^ ]+?)(?:(\s*/)| .*?)?>', re.S)
 re_newlines = re.compile(r'\r\n|\r')  # Used in normalize_newlines
 re_camel_case = re.compile(r'(((?<=[a-z])[A-Z])|([A-Z](?![A-Z]|$)))')
 
@@ -283,19 +395,18 @@ class Truncator(SimpleLazyObject):
         """
         length = int(num)
         text = unicodedata.normalize('NFC', self._wrapped)
-
-        # Calculate the length to truncate to (max length - end_text length)
-        truncate_len = length
-        for char in self.add_truncation_text('', truncate):
-            if not unicodedata.combining(char):
-                truncate_len -= 1
-                if truncate_len == 0:
-                    break
+        truncate_len = self._truncate_len(length, truncate)
         if html:
             return self._truncate_html(length, truncate, text, truncate_len, False)
         return self._text_chars(length, truncate, text, truncate_len)
     chars = allow_lazy(chars)
 
+    def _truncate_len(self, length, truncate):
+        """
+        Calculates the length to truncate to (max length - end_text length).
+        """
+        return truncate_len(length, self.add_truncation_text('', truncate))
+
     def _text_chars(self, length, truncate, text, truncate_len):
         """
         Truncates a string after a certain number of chars.
@@ -350,69 +461,40 @@ class Truncator(SimpleLazyObject):
 
         Newlines in the HTML are preserved.
         """
-        if words and length <= 0:
-            return ''
-
-        html4_singlets = (
-            'br', 'col', 'link', 'base', 'img',
-            'param', 'area', 'hr', 'input'
-        )
+        return truncate_html((text,), length,
+                             self.add_truncation_text('', truncate),
+                             words, truncate_len)
 
-        # Count non-HTML chars/words and keep note of open tags
-        pos = 0
-        end_text_pos = 0
-        current_len = 0
-        open_tags = []
 
-        regex = re_words if words else re_chars
+def truncate_html_chunks(chunks, num, truncate=None, words=False):
+    """
+    Truncates HTML given as an iterable of text chunks the same way as
+    ``Truncator(html).chars(num, html=True)``, or ``.words()`` if words is
+    True, without reading chunks past the truncate point.
+    """
+    ending = Truncator('').add_truncation_text('', truncate)
+    if words:
+        return truncate_html(chunks, int(num), ending, True)
+    return truncate_html(_normalize_chunks(chunks), int(num), ending)
 
-        while current_len <= length:
-            m = regex.search(text, pos)
-            if not m:
-                # Checked through whole string
-                break
-            pos = m.end(0)
-            if m.group(1):
-                # It's an actual non-HTML word or char
-                current_len += 1
-                if current_len == truncate_len:
-                    end_text_pos = pos
-                continue
-            # Check for tag
-            tag = re_tag.match(m.group(0))
-            if not tag or current_len >= truncate_len:
-                # Don't worry about non tags or tags after our truncate point
-                continue
-            closing_tag, tagname, self_closing = tag.groups()
-            # Element names are always case-insensitive
-            tagname = tagname.lower()
-            if self_closing or tagname in html4_singlets:
-                pass
-            elif closing_tag:
-                # Check for match in open tags list
-                try:
-                    i = open_tags.index(tagname)
-                except ValueError:
-                    pass
-                else:
-                    # SGML: An end tag closes, back to the matching start tag,
-                    # all unclosed intervening start tags with omitted end tags
-                    open_tags = open_tags[i + 1:]
-            else:
-                # Add it to the start of the open tags list
-                open_tags.insert(0, tagname)
 
-        if current_len <= length:
-            return text
-        out = text[:end_text_pos]
-        truncate_text = self.add_truncation_text('', truncate)
-        if truncate_text:
-            out += truncate_text
-        # Close any tags still open
-        for tag in open_tags:
-            out += '</%s>' % tag
-        # Return string
-        return out
+def _normalize_chunks(chunks):
+    """
+    NFC-normalizes text chunks, holding back the last character and any
+    combining characters after it until the next chunk, which may continue
+    them.
+    """
+    pending = ''
+    for chunk in chunks:
+        text = pending + force_text(chunk)
+        cut = len(text) - 1
+        while cut > 0 and unicodedata.combining(text[cut]):
+            cut -= 1
+        if cut > 0:
+            yield unicodedata.normalize('NFC', text[:cut])
+        pending = text[max(cut, 0):]
+    if pending:
+        yield unicodedata.normalize('NFC', pending)
 
 
 def get_valid_filename(s):
@@ -472,7 +554,10 @@ phone2numeric = allow_lazy(phone2numeric)
 
 # From http://www.xhaus.com/alan/python/httpcomp.html#gzip
 # Used with permission.
-def compress_string(s):
+def compress_string(s, parallel_threshold=8 << 20):
+    if len(s) >= parallel_threshold:
+        # Large payloads are compressed on all cores
+        return compress_parallel(s, level=6)
     zbuf = BytesIO()
     zfile = GzipFile(mode='wb', compresslevel=6, fileobj=zbuf)
     zfile.write(s)
@@ -501,19 +586,10 @@ class StreamingBuffer(object):
         return
 
 
-# Like compress_string, but for iterators of strings.
-def compress_sequence(sequence):
-    buf = StreamingBuffer()
-    zfile = GzipFile(mode='wb', compresslevel=6, fileobj=buf)
-    # Output headers...
-    yield buf.read()
-    for item in sequence:
-        zfile.write(item)
-        data = buf.read()
-        if data:
-            yield data
-    zfile.close()
-    yield buf.read()
+# Like compress_string, but for iterators of strings. Output is coalesced
+# into chunks of at least min_size bytes; see compress.compress_stream.
+def compress_sequence(sequence, level=6, min_size=16384):
+    return compress_stream(sequence, 'gzip', level, min_size)
 
 
 # Expression to match some_token and some_token="with spaces" (and similarly
@@ -549,8 +625,17 @@ def smart_split(text):
         yield bit.group(0)
 
 
+# Named entities by the text between '&' and ';'
+_entity_chars = dict(
+    (name, six.unichr(codepoint))
+    for name, codepoint in html_entities.name2codepoint.items())
+
+
 def _replace_entity(match):
     text = match.group(1)
+    char = _entity_chars.get(text)
+    if char is not None:
+        return char
     if text[0] == '#':
         text = text[1:]
         try:
@@ -559,22 +644,41 @@ def _replace_entity(match):
             else:
                 c = int(text)
             return six.unichr(c)
-        except ValueError:
-            return match.group(0)
-    else:
-        try:
-            return six.unichr(html_entities.name2codepoint[text])
-        except (ValueError, KeyError):
-            return match.group(0)
+        except (ValueError, OverflowError):
+            pass
+    return match.group(0)
 
 _entity_re = re.compile(r"&(#?[xX]?(?:[0-9a-fA-F]+|\w{1,8}));")
+# What a chunk may end with if an entity continues in the next chunk
+_entity_prefix_re = re.compile(r"&#?[xX]?(?:[0-9a-fA-F]*|\w{0,8})\Z")
 
 
 def unescape_entities(text):
+    if '&' not in text:
+        return text
     return _entity_re.sub(_replace_entity, text)
 unescape_entities = allow_lazy(unescape_entities, six.text_type)
 
 
+def unescape_entities_chunks(chunks):
+    """
+    Like unescape_entities, for text given as an iterable of chunks. Yields
+    unescaped chunks, holding back the end of a chunk that may be the start
+    of an entity split across chunks.
+    """
+    pending = ''
+    for chunk in chunks:
+        text = pending + chunk
+        pending = ''
+        amp = text.rfind('&')
+        if amp >= 0 and _entity_prefix_re.match(text, amp):
+            text, pending = text[:amp], text[amp:]
+        if text:
+            yield unescape_entities(text)
+    if pending:
+        yield unescape_entities(pending)
+
+
 def unescape_string_literal(s):
     r"""
     Convert quoted string literals to unquoted strings with escaped quotes and
@@ -596,23 +700,117 @@ def unescape_string_literal(s):
 unescape_string_literal = allow_lazy(unescape_string_literal)
 
 
+class Slugifier(object):
+    """
+    Compiled version of slugify: regular expressions are compiled once,
+    ASCII input, the common case, is lowercased and stripped of unwanted
+    characters with a single str.translate call, and results are memoized
+    for up to cache_size distinct values.
+    """
+    def __init__(self, allow_unicode=False, cache_size=10000):
+        self.allow_unicode = allow_unicode
+        self.cache_size = cache_size
+        self._cache = {}
+        self._re_unwanted = re.compile(r'[^\w\s-]', re.U)
+        self._re_separators = re.compile(r'[-\s]+', re.U)
+        # Byte translation lowercasing and turning whitespace into plain
+        # spaces, and the bytes re_unwanted would delete
+        table = bytearray(range(256))
+        deleted = bytearray()
+        for code in range(128):
+            char = six.unichr(code)
+            if char.isspace():
+                table[code] = ord(' ')
+            elif not (char.isalnum() or char in '_-'):
+                deleted.append(code)
+            elif char.isupper():
+                table[code] = ord(char.lower())
+        self._ascii_table = bytes(table)
+        self._ascii_deleted = bytes(deleted)
+
+    def __call__(self, value):
+        value = force_text(value)
+        try:
+            return self._cache[value]
+        except KeyError:
+            pass
+        result = mark_safe(self._slugify(value))
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[value] = result
+        return result
+
+    def _slugify(self, value):
+        try:
+            ascii = value.encode('ascii')
+        except UnicodeError:
+            pass
+        else:
+            value = ascii.translate(self._ascii_table, self._ascii_deleted)
+            value = value.decode('ascii').strip()
+            if '-' not in value:
+                return '-'.join(value.split())
+            # Runs of hyphens and spaces become one hyphen, including at
+            # either end
+            slug = '-'.join(value.replace('-', ' ').split())
+            if not slug:
+                return '-'
+            if value[0] == '-':
+                slug = '-' + slug
+            if value[-1] == '-':
+                slug += '-'
+            return slug
+        if self.allow_unicode:
+            value = unicodedata.normalize('NFKC', value)
+        else:
+            value = unicodedata.normalize('NFKD', value).encode(
+                'ascii', 'ignore').decode('ascii')
+        value = self._re_unwanted.sub('', value).strip().lower()
+        return self._re_separators.sub('-', value)
+
+    def many(self, values):
+        return [self(value) for value in values]
+
+
+_slugifiers = {False: Slugifier(), True: Slugifier(allow_unicode=True)}
+
+
+def _slugify_chunk(args):
+    values, allow_unicode = args
+    return _slugifiers[allow_unicode].many(values)
+
+
 def slugify(value, allow_unicode=False):
     """
     Convert to ASCII if 'allow_unicode' is False. Convert spaces to hyphens.
     Remove characters that aren't alphanumerics, underscores, or hyphens.
     Convert to lowercase. Also strip leading and trailing whitespace.
     """
-    value = force_text(value)
-    if allow_unicode:
-        value = unicodedata.normalize('NFKC', value)
-        value = re.sub('[^\w\s-]', '', value, flags=re.U).strip().lower()
-        return mark_safe(re.sub('[-\s]+', '-', value, flags=re.U))
-    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
-    value = re.sub('[^\w\s-]', '', value).strip().lower()
-    return mark_safe(re.sub('[-\s]+', '-', value))
+    return _slugifiers[bool(allow_unicode)](value)
 slugify = allow_lazy(slugify, six.text_type, SafeText)
 
 
+def slugify_many(values, allow_unicode=False, processes=None,
+                 chunksize=10000, parallel_threshold=100000):
+    """
+    Slugify a list of values in this process. With processes, batches of at
+    least parallel_threshold values are split in chunks of chunksize across
+    a pool of that many processes; starting it and pickling values and slugs
+    costs more than it saves on smaller batches.
+    """
+    values = list(values)
+    allow_unicode = bool(allow_unicode)
+    if not processes or len(values) < max(parallel_threshold, chunksize + 1):
+        return _slugifiers[allow_unicode].many(values)
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunks = [(values[i:i + chunksize], allow_unicode)
+              for i in range(0, len(values), chunksize)]
+    with ProcessPoolExecutor(processes) as executor:
+        return [slug for slugs in executor.map(_slugify_chunk, chunks)
+                for slug in slugs]
+
+
 def camel_case_to_spaces(value):
     """
     Splits CamelCase and converts to lower case. Also strips leading and
@@ -773,20 +971,117 @@ def get_encodings_from_content(content):
 
 
 def force_decode(string, encoding):
-    """Forcibly get a unicode string out of a bytestring."""
+    """Forcibly get a unicode string out of a bytestring.
+
+    Without an encoding, bytes that aren't valid UTF-8 are decoded with the
+    charset named by their BOM, XML declaration or meta tag, as found by
+    detect_encoding, if they are valid in it. Anything else is decoded as
+    latin1.
+    """
     if isinstance(string, binary_type):
         try:
             if encoding:
-                string = string.decode(encoding)
-            else:
-                # try decoding with utf-8, should only work for real UTF-8
-                string = string.decode('utf-8')
+                return string.decode(encoding)
+            # try decoding with utf-8, should only work for real UTF-8
+            return string.decode('utf-8')
         except UnicodeError:
-            # last resort -- can't fail
-            string = string.decode('latin1')
+            pass
+        if not encoding:
+            declared = _declared_encoding(string, 4096)
+            if declared:
+                try:
+                    return string.decode(declared)
+                except UnicodeError:
+                    pass
+        # last resort -- can't fail
+        string = string.decode('latin1')
     return string
 
 
+_bom_encodings = (
+    # UTF-32 first, as its little-endian BOM starts like UTF-16's
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+_xml_encoding_re = re.compile(
+    br'^<\?xml[^>]*?encoding\s*=\s*["\']([-\w.:]+)', re.I)
+_meta_charset_re = re.compile(
+    br'<meta[^>]*?charset\s*=\s*["\']?\s*([-\w.:]+)', re.I)
+
+
+def _is_ascii(data):
+    try:
+        return data.isascii()
+    except AttributeError:
+        # Before Python 3.7
+        try:
+            data.decode('ascii')
+        except UnicodeError:
+            return False
+        return True
+
+
+def _declared_encoding(content, scan_size):
+    """Returns the codec named by a BOM, or by an XML declaration or meta
+    tag within the first scan_size bytes, if it is a known one."""
+    for bom, encoding in _bom_encodings:
+        if content.startswith(bom):
+            return encoding
+    head = content[:scan_size]
+    for regex in (_xml_encoding_re, _meta_charset_re):
+        m = regex.search(head)
+        if m:
+            try:
+                name = codecs.lookup(m.group(1).decode('ascii')).name
+            except LookupError:
+                continue
+            # A declaration read as ASCII can't really be UTF-16 or 32
+            if name.startswith(('utf-16', 'utf-32')):
+                return 'utf-8'
+            return name
+    return None
+
+
+def detect_encoding(content, default=None, scan_size=4096):
+    """Detects the encoding of a byte string such as a crawled page.
+
+    Only the first scan_size bytes are searched for a BOM, an XML
+    declaration or a meta charset. Without one, the content is checked to be
+    ASCII, then UTF-8; default is returned if it's neither.
+    """
+    encoding = _declared_encoding(content, scan_size)
+    if encoding:
+        return encoding
+    if _is_ascii(content):
+        return 'ascii'
+    try:
+        content.decode('utf-8')
+    except UnicodeDecodeError:
+        return default
+    return 'utf-8'
+
+
+def decode_content(content, default='latin-1', scan_size=4096):
+    """Decodes a byte string like detect_encoding would detect its encoding,
+    decoding only once where possible. Returns (text, encoding).
+
+    Invalid bytes in declared encodings are replaced; undeclared content
+    that is not UTF-8 is decoded as default.
+    """
+    encoding = _declared_encoding(content, scan_size)
+    if encoding:
+        return content.decode(encoding, 'replace'), encoding
+    if _is_ascii(content):
+        return content.decode('ascii'), 'ascii'
+    try:
+        return content.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        return content.decode(default, 'replace'), default
+
+
 ##
 
 
@@ -808,9 +1103,10 @@ def force_decode(string, encoding):
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 
 # Make coding more python3-ish
-from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import codecs
+
 from ansible.compat.six import string_types, text_type, binary_type, PY3
 
 # to_bytes and to_unicode were written by Toshio Kuratomi for the
@@ -832,6 +1128,20 @@ _LATIN1_ALIASES = frozenset(('latin-1', 'LATIN-1', 'latin1', 'LATIN1',
 if PY3:
     basestring = (str, bytes)
 
+#: Codecs by encoding name, so each name is looked up only once
+_CODECS = {}
+
+
+def _codec(encoding):
+    try:
+        return _CODECS[encoding]
+    except KeyError:
+        codec = codecs.lookup(encoding)
+        if len(_CODECS) < 1024:
+            _CODECS[encoding] = codec
+        return codec
+
+
 def to_unicode(obj, encoding='utf-8', errors='replace', nonstring=None):
     '''Convert an object into a :class:`unicode` string
 
@@ -883,6 +1193,15 @@ def to_unicode(obj, encoding='utf-8', errors='replace', nonstring=None):
     output that you don't expect.  Be sure you understand the requirements of
     your data, not just ignore errors by passing it through this function.
     '''
+    # Fast path for exact types, which is what we get nearly always
+    obj_type = type(obj)
+    if obj_type is text_type:
+        return obj
+    if obj_type is binary_type:
+        if encoding in _UTF8_ALIASES:
+            return obj.decode('utf-8', errors)
+        return _codec(encoding).decode(obj, errors)[0]
+
     # Could use isbasestring/isunicode here but we want this code to be as
     # fast as possible
     if isinstance(obj, basestring):
@@ -992,6 +1311,15 @@ def to_bytes(obj, encoding='utf-8', errors='replace', nonstring=None):
     don't expect.  Be sure you understand the requirements of your data, not
     just ignore errors by passing it through this function.
     '''
+    # Fast path for exact types, which is what we get nearly always
+    obj_type = type(obj)
+    if obj_type is binary_type:
+        return obj
+    if obj_type is text_type:
+        if encoding in _UTF8_ALIASES:
+            return obj.encode('utf-8', errors)
+        return _codec(encoding).encode(obj, errors)[0]
+
     # Could use isbasestring, isbytestring here but we want this to be as fast
     # as possible
     if isinstance(obj, basestring):
@@ -1039,6 +1367,62 @@ def to_bytes(obj, encoding='utf-8', errors='replace', nonstring=None):
         ' action' % {'param': nonstring})
 
 
+def to_unicode_many(objs, encoding='utf-8', errors='replace', nonstring=None):
+    '''Convert every object of an iterable like :func:`to_unicode`, returning
+    a list.
+
+    The type checks and codec lookup are done once for the whole batch, so
+    this is faster than calling :func:`to_unicode` in a loop.
+    '''
+    if encoding in _UTF8_ALIASES:
+        def decode(obj):
+            return obj.decode('utf-8', errors)
+    else:
+        codec_decode = _codec(encoding).decode
+
+        def decode(obj):
+            return codec_decode(obj, errors)[0]
+    result = []
+    append = result.append
+    for obj in objs:
+        obj_type = type(obj)
+        if obj_type is text_type:
+            append(obj)
+        elif obj_type is binary_type:
+            append(decode(obj))
+        else:
+            append(to_unicode(obj, encoding, errors, nonstring))
+    return result
+
+
+def to_bytes_many(objs, encoding='utf-8', errors='replace', nonstring=None):
+    '''Convert every object of an iterable like :func:`to_bytes`, returning
+    a list.
+
+    The type checks and codec lookup are done once for the whole batch, so
+    this is faster than calling :func:`to_bytes` in a loop.
+    '''
+    if encoding in _UTF8_ALIASES:
+        def encode(obj):
+            return obj.encode('utf-8', errors)
+    else:
+        codec_encode = _codec(encoding).encode
+
+        def encode(obj):
+            return codec_encode(obj, errors)[0]
+    result = []
+    append = result.append
+    for obj in objs:
+        obj_type = type(obj)
+        if obj_type is binary_type:
+            append(obj)
+        elif obj_type is text_type:
+            append(encode(obj))
+        else:
+            append(to_bytes(obj, encoding, errors, nonstring))
+    return result
+
+
 # force the return value of a function to be unicode.  Use with partial to
 # ensure that a filter will return unicode values.
 def unicode_wrap(func, *args, **kwargs):
@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+
+import functools
+import importlib
+import timeit
+
+
+def bench(label, stmt, number=10):
+    elapsed = min(timeit.repeat(stmt, number=number, repeat=3)) / number
+    print('{0:<50} {1:>10.3f} ms'.format(label, elapsed * 1000))
+    return elapsed
+
+
+def requires(*modules):
+    """Skip the decorated bench, saying why, when one of the modules it
+    needs can't be imported on this interpreter."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for module in modules:
+                try:
+                    importlib.import_module(module)
+                except (ImportError, SyntaxError) as e:
+                    print('{0:<50} skipped: {1}: {2}'.format(
+                        func.__name__, module, e))
+                    return
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Data structures
+# ---------------
+
+@requires('banchan.ds')
+def bench_multidict_parse(params=10000):
+    try:
+        from urllib.parse import unquote_plus
+    except ImportError:
+        from urllib import unquote_plus
+    from banchan.ds import FlatOrderedMultiDict, OrderedMultiDict
+
+    body = '&'.join('field{0}=value+{1}'.format(i % 500, i)
+                    for i in range(params))
+
+    def parse(cls):
+        d = cls()
+        for pair in body.split('&'):
+            key, _, value = pair.partition('=')
+            d.add(unquote_plus(key), unquote_plus(value))
+        return list(d.items(multi=True))
+
+    bench('OrderedMultiDict parse {0} params'.format(params),
+          lambda: parse(OrderedMultiDict))
+    bench('FlatOrderedMultiDict parse {0} params'.format(params),
+          lambda: parse(FlatOrderedMultiDict))
+
+
+# Signals
+# -------
+
+@requires('banchan.dispatch')
+def bench_signal_send(sends=20000):
+    import threading
+    import time
+    from banchan.dispatch import Signal
+
+    for count in (1, 10, 100):
+        signal = Signal()
+        receivers = [lambda **kwargs: None for _ in range(count)]
+        for r in receivers:
+            signal.connect(r)
+        for threads in (1, 4):
+            def worker():
+                for _ in range(sends // threads):
+                    signal.send(sender=None)
+            workers = [threading.Thread(target=worker) for _ in range(threads)]
+            start = time.time()
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+            elapsed = time.time() - start
+            print('{0:<50} {1:>10.0f} sends/s'.format(
+                'Signal.send {0} receivers, {1} threads'.format(
+                    count, threads),
+                sends / elapsed))
+
+
+# Routing
+# -------
+
+@requires('banchan.route')
+def bench_route(count=300, paths=20000):
+    import random
+    import re
+    from banchan.route import CompiledRouter
+
+    random.seed(0)
+    routes = [('/section{0}/(?P<slug>[a-z-]+)/(?P<id>\\d+)$'.format(i),
+               'handler{0}'.format(i)) for i in range(count)]
+    urls = ['/section{0}/some-slug/{1}'.format(random.randrange(count * 2), i)
+            for i in range(paths)]
+    compiled = [(re.compile(pattern), handler) for pattern, handler in routes]
+
+    def linear():
+        for path in urls:
+            for pattern, handler in compiled:
+                if pattern.match(path):
+                    break
+
+    def router():
+        r = CompiledRouter(routes, cache_size=0)
+        for path in urls:
+            r.match(path)
+
+    bench('linear re.match, {0} routes'.format(count), linear, number=1)
+    bench('CompiledRouter, {0} routes'.format(count), router, number=1)
+
+
+# Geo
+# ---
+
+@requires('numpy', 'banchan.geo')
+def bench_haversine(points=10 ** 6):
+    import numpy as np
+    from banchan.geo import haversine, haversine_many
+
+    rng = np.random.RandomState(0)
+    array = np.column_stack([rng.uniform(-180, 180, points),
+                             rng.uniform(-90, 90, points)])
+    pairs = [tuple(p) for p in array]
+    origin = (126.97, 37.56)
+
+    bench('haversine loop, {0} points'.format(points),
+          lambda: [haversine(origin, p) for p in pairs], number=1)
+    bench('haversine_many, {0} points'.format(points),
+          lambda: haversine_many(origin, array), number=1)
+
+
+@requires('numpy', 'banchan.geo')
+def bench_geo_radius(points=100000, queries=200, radius=2000):
+    import numpy as np
+    from banchan.geo import GridIndex2D, Rtree, Rtree2D, haversine_many
+
+    # Dense points: a city-sized square around Seoul
+    rng = np.random.RandomState(0)
+    array = np.column_stack([rng.uniform(126.8, 127.2, points),
+                             rng.uniform(37.4, 37.7, points)])
+    origins = [tuple(p) for p in array[:queries]]
+
+    def brute():
+        for origin in origins:
+            distances = haversine_many(origin, array)
+            np.flatnonzero(distances <= radius)
+
+    indexes = [('GridIndex2D', GridIndex2D(cell_size=0.01))]
+    if Rtree is not None:
+        indexes.append(('Rtree2D', Rtree2D()))
+    bench('haversine_many scan, {0} points'.format(points), brute, number=1)
+    for name, index in indexes:
+        for i, p in enumerate(array):
+            index.set(i, tuple(p))
+        bench('{0}.within {1} m, {2} points'.format(name, radius, points),
+              lambda: [index.within(origin, radius) for origin in origins],
+              number=1)
+        bench('{0}.nearest 10 within {1} m'.format(name, radius),
+              lambda: [index.nearest(origin, 10, max_distance=radius)
+                       for origin in origins],
+              number=1)
+
+
+@requires('numpy', 'banchan.geo')
+def bench_geo_bulk_load(points=200000):
+    import numpy as np
+    from banchan.geo import GridIndex2D, Rtree, Rtree2D
+
+    rng = np.random.RandomState(0)
+    items = [(i, (lon, lat)) for i, (lon, lat) in enumerate(np.column_stack(
+        [rng.uniform(-180, 180, points), rng.uniform(-90, 90, points)]
+    ).tolist())]
+
+    def one_by_one(cls):
+        index = cls()
+        for item in items:
+            index.set(*item)
+
+    classes = [GridIndex2D] + ([Rtree2D] if Rtree is not None else [])
+    for cls in classes:
+        bench('{0}.set, {1} points'.format(cls.__name__, points),
+              lambda: one_by_one(cls), number=1)
+        bench('{0}.bulk_load, {1} points'.format(cls.__name__, points),
+              lambda: cls().bulk_load(items), number=1)
+
+
+@requires('banchan.geo')
+def bench_ip_lookup(ranges=100000, lookups=100000):
+    import os
+    import random
+    import shutil
+    import socket
+    import struct
+    import tempfile
+    from banchan.geo import IPLocationDB
+
+    random.seed(0)
+    directory = tempfile.mkdtemp()
+    try:
+        csv_path = os.path.join(directory, 'ranges.csv')
+        starts = sorted(256 * i for i in
+                        random.sample(range(2 ** 24), ranges))
+        with open(csv_path, 'w') as f:
+            for i, start in enumerate(starts):
+                f.write('{0},{1},KR,City{2}\n'.format(
+                    start, start + 255, i % 1000))
+        path = os.path.join(directory, 'ranges.bin')
+        bench('IPLocationDB.compile, {0} ranges'.format(ranges),
+              lambda: IPLocationDB.compile(csv_path, path).close(), number=1)
+
+        db = IPLocationDB(path, cache_size=0)
+        ips = [socket.inet_ntoa(struct.pack('!I', random.randrange(2 ** 32)))
+               for _ in range(lookups)]
+        bench('IPLocationDB.lookup, {0} ips'.format(lookups),
+              lambda: [db.lookup(ip) for ip in ips], number=1)
+        bench('IPLocationDB.lookup_many, {0} ips'.format(lookups),
+              lambda: db.lookup_many(ips), number=1)
+        db.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+# Text
+# ----
+
+@requires('banchan.text')
+def bench_truncate_html(size=2 ** 20):
+    from banchan.text import Truncator, truncate_html_chunks
+
+    block = ('<div class="c"><p>Some <b>bold</b> text and '
+             '<a href="/x">a link</a> here.</p><br>\n')
+    html = block * (size // len(block))
+    chunks = [html[i:i + 65536] for i in range(0, len(html), 65536)]
+
+    for num in (1000, size):
+        bench('Truncator.chars({0}, html=True), 1 MB'.format(num),
+              lambda: Truncator(html).chars(num, html=True), number=1)
+        bench('Truncator.words({0}, html=True), 1 MB'.format(num),
+              lambda: Truncator(html).words(num, html=True), number=1)
+        bench('truncate_html_chunks({0}), 64 KB chunks'.format(num),
+              lambda: truncate_html_chunks(iter(chunks), num), number=1)
+
+
+@requires('banchan.text')
+def bench_to_unicode(values=10 ** 6):
+    from banchan.text import to_bytes_many, to_unicode, to_unicode_many
+
+    data = [('field value {0}'.format(i)).encode('utf-8')
+            for i in range(values)]
+    for encoding in ('utf-8', 'cp1252'):
+        bench('to_unicode loop, {0}, {1} values'.format(encoding, values),
+              lambda: [to_unicode(v, encoding) for v in data], number=1)
+        bench('to_unicode_many, {0}, {1} values'.format(encoding, values),
+              lambda: to_unicode_many(data, encoding), number=1)
+    text = to_unicode_many(data)
+    bench('to_bytes_many, utf-8, {0} values'.format(values),
+          lambda: to_bytes_many(text), number=1)
+
+
+@requires('banchan.text')
+def bench_slugify(values=200000, distinct=50000):
+    import re
+    import unicodedata
+    from django.utils.encoding import force_text
+    from django.utils.safestring import mark_safe
+    from banchan.text import Slugifier, slugify, slugify_many
+
+    def baseline(value):
+        # The previous slugify: normalize and three regex passes per value
+        value = force_text(value)
+        value = unicodedata.normalize('NFKD', value).encode(
+            'ascii', 'ignore').decode('ascii')
+        value = re.sub(r'[^\w\s-]', '', value).strip().lower()
+        return mark_safe(re.sub(r'[-\s]+', '-', value))
+
+    titles = ['Product Title Number {0} - Blue/Red (XL)'.format(i % distinct)
+              for i in range(values)]
+    bench('previous slugify loop, {0} titles'.format(values),
+          lambda: [baseline(t) for t in titles], number=1)
+    bench('slugify loop, {0} titles'.format(values),
+          lambda: [slugify(t) for t in titles], number=1)
+    bench('Slugifier without memo, {0} titles'.format(values),
+          lambda: Slugifier(cache_size=1).many(titles), number=1)
+    bench('slugify_many, {0} titles'.format(values),
+          lambda: slugify_many(titles), number=1)
+    bench('slugify_many, 4 processes, {0} titles'.format(values),
+          lambda: slugify_many(titles, processes=4), number=1)
+
+
+@requires('banchan.text')
+def bench_unescape_entities(lines=30000):
+    from banchan.text import unescape_entities, unescape_entities_chunks
+
+    html = '<p>Caf&eacute; &amp; bar &lt;b&gt; &#8220;quoted&#8221;</p>\n' * lines
+    plain = '<p>Cafe and bar, quoted text</p>\n' * lines
+    chunks = [html[i:i + 65536] for i in range(0, len(html), 65536)]
+    bench('unescape_entities, {0} KB with entities'.format(len(html) >> 10),
+          lambda: unescape_entities(html))
+    bench('unescape_entities, {0} KB without'.format(len(plain) >> 10),
+          lambda: unescape_entities(plain))
+    bench('unescape_entities_chunks, 64 KB chunks',
+          lambda: list(unescape_entities_chunks(chunks)))
+
+
+@requires('banchan.text')
+def bench_html_stream(lines=20000):
+    from banchan.text import (extract_urls, extract_urls_stream, strip_tags,
+                              strip_tags_stream)
+
+    html = ('<div><a href="https://example.com/page/1">Link</a> some text '
+            'here &amp; more</div>\n') * lines
+    chunks = [html[i:i + 65536] for i in range(0, len(html), 65536)]
+    bench('strip_tags, {0} KB'.format(len(html) >> 10),
+          lambda: strip_tags(html))
+    bench('strip_tags_stream, 64 KB chunks',
+          lambda: ''.join(strip_tags_stream(chunks)))
+    bench('extract_urls, {0} KB'.format(len(html) >> 10),
+          lambda: extract_urls(html))
+    bench('extract_urls_stream, 64 KB chunks',
+          lambda: list(extract_urls_stream(chunks)))
+
+
+@requires('banchan.text')
+def bench_decode_content(lines=30000):
+    from banchan.text import decode_content, force_decode
+
+    body = ('<p>Texte accentu\u00e9 \u2014 ok</p>\n' * lines).encode('utf-8')
+    pages = [
+        ('meta charset', b'<html><head><meta charset="utf-8"></head>' + body),
+        ('undeclared utf-8', body),
+        ('undeclared ascii', b'<p>plain text</p>\n' * lines),
+    ]
+    for label, page in pages:
+        bench('decode_content, {0}, {1} KB'.format(label, len(page) >> 10),
+              lambda: decode_content(page))
+    bench('force_decode, undeclared utf-8', lambda: force_decode(body, None))
+
+
+# Compression
+# -----------
+
+@requires('banchan.compress', 'banchan.text')
+def bench_compress_stream(items=100000):
+    from gzip import GzipFile
+    from banchan.compress import compress_stream
+    from banchan.text import StreamingBuffer
+
+    sequence = [('{{"id": {0}, "name": "item {0}"}},\n'.format(i)).encode()
+                for i in range(items)]
+
+    def gzip_file():
+        # The previous compress_sequence: one GzipFile write per item
+        buf = StreamingBuffer()
+        zfile = GzipFile(mode='wb', compresslevel=6, fileobj=buf)
+        chunks = [buf.read()]
+        for item in sequence:
+            zfile.write(item)
+            data = buf.read()
+            if data:
+                chunks.append(data)
+        zfile.close()
+        chunks.append(buf.read())
+        return chunks
+
+    bench('GzipFile per item, {0} items'.format(items), gzip_file, number=1)
+    for level in (1, 6):
+        bench('compress_stream gzip level {0}, {1} items'.format(
+            level, items),
+            lambda: list(compress_stream(sequence, level=level)), number=1)
+
+
+@requires('banchan.compress', 'concurrent.futures')
+def bench_compress_parallel(size=64 << 20):
+    import multiprocessing
+    from gzip import GzipFile
+    from io import BytesIO
+    from banchan.compress import compress_parallel
+
+    line = b'{"id": 12345, "name": "some item", "tags": ["a", "b"]}\n'
+    data = line * (size // len(line))
+
+    def gzip_file():
+        buf = BytesIO()
+        with GzipFile(mode='wb', compresslevel=6, fileobj=buf) as zfile:
+            zfile.write(data)
+        return buf.getvalue()
+
+    bench('GzipFile, {0} MB'.format(size >> 20), gzip_file, number=1)
+    for workers in sorted(set([1, 2, 4, multiprocessing.cpu_count()])):
+        bench('compress_parallel, {0} MB, {1} workers'.format(
+            size >> 20, workers),
+            lambda: compress_parallel(data, workers=workers), number=1)
+
+
+if __name__ == '__main__':
+    import sys
+    names = sys.argv[1:] or sorted(
+        name for name in dict(globals()) if name.startswith('bench_'))
+    for name in names:
+        globals()[name]()
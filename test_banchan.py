@@ -1,7 +1,178 @@
 #!/usr/bin/env python
 
+import gzip
+import random
+import re
+import time
+
 import pytest
 
+from banchan.html import truncate_html, truncate_len
+
+
+# Data structures
+# ---------------
+
+def test_prefix_index_save_load_keeps_weight_types(tmpdir):
+    from banchan.ds import PrefixIndex
+
+    index = PrefixIndex(k=3)
+    index.update([(u'python', 10), (u'pypy', 2.5), (u'perl', 7),
+                  (u'p\xe9rou', -3), (u'pascal', 1 << 62), (u'php', 0.0)])
+    path = str(tmpdir.join('index.bin'))
+    index.save(path)
+    loaded = PrefixIndex.load(path)
+    assert sorted(loaded.items()) == sorted(index.items())
+    for key, weight in index.items():
+        assert type(loaded.get(key)) is type(weight), key
+    assert loaded.top(u'p') == index.top(u'p')
+    assert loaded.top(u'py') == [(u'python', 10), (u'pypy', 2.5)]
+
+
+# Text
+# ----
+
+_re_words = re.compile(r'<.*?>|((?:\w[-\w]*|&.*?;)+)', re.U | re.S)
+_re_chars = re.compile(r'<.*?>|(.)', re.U | re.S)
+_re_tag = re.compile(r'<(/)?([^ ]+?)(?:(\s*/)| .*?)?>', re.S)
+
+
+def _truncate_html_reference(text, length, truncate_len, words, ending):
+    """HTML truncation the way Truncator did it on a whole string before it
+    learned to read chunks, as the reference for `truncate_html`."""
+    if words and length <= 0:
+        return ''
+    singlets = ('br', 'col', 'link', 'base', 'img', 'param', 'area', 'hr',
+                'input')
+    pos = 0
+    end_text_pos = 0
+    current_len = 0
+    open_tags = []
+    regex = _re_words if words else _re_chars
+    while current_len <= length:
+        m = regex.search(text, pos)
+        if not m:
+            break
+        pos = m.end(0)
+        if m.group(1):
+            current_len += 1
+            if current_len == truncate_len:
+                end_text_pos = pos
+            continue
+        tag = _re_tag.match(m.group(0))
+        if not tag or current_len >= truncate_len:
+            continue
+        closing_tag, tagname, self_closing = tag.groups()
+        tagname = tagname.lower()
+        if self_closing or tagname in singlets:
+            pass
+        elif closing_tag:
+            if tagname in open_tags:
+                open_tags = open_tags[open_tags.index(tagname) + 1:]
+        else:
+            open_tags.insert(0, tagname)
+    if current_len <= length:
+        return text
+    return text[:end_text_pos] + ending + ''.join(
+        '</%s>' % tag for tag in open_tags)
+
+
+_HTML_PIECES = ['word', 'a', 'x-y', ' ', ' ', '\n', '&amp;', '&', ';', '<',
+                '>', '<b>', '</b>', '<i class="c">', '</i>', '<br/>', '<p>',
+                '</P>', '<!-- c -->', '&#39;']
+
+
+def _random_html(rnd):
+    return ''.join(rnd.choice(_HTML_PIECES)
+                   for _ in range(rnd.randint(0, 30)))
+
+
+def _random_chunks(rnd, text):
+    cuts = sorted(rnd.randint(0, len(text))
+                  for _ in range(rnd.randint(0, 6)))
+    return [text[start:end]
+            for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize('words', [False, True])
+def test_truncate_html_matches_reference(words):
+    rnd = random.Random(20161019)
+    for _ in range(5000):
+        html = _random_html(rnd)
+        length = rnd.randint(0, 12)
+        max_text = length if words else truncate_len(length, '...')
+        expected = _truncate_html_reference(html, length, max_text, words,
+                                            '...')
+        result = truncate_html([html], length, '...', words)
+        assert result == expected, (html, length)
+        chunks = _random_chunks(rnd, html)
+        result = truncate_html(chunks, length, '...', words)
+        assert result == expected, (chunks, length)
+
+
+# Compression
+# -----------
+
+@pytest.mark.parametrize('blocks', [
+    [],
+    [b''],
+    [b'', b''],
+    [b'abc', b''],
+    [b'', b'abc', b'', b'def'],
+    [bytes(bytearray(range(256))) * 300] * 5,
+])
+def test_compress_blocks_parallel_roundtrip(blocks):
+    compress = pytest.importorskip('banchan.compress')
+    data = b''.join(compress.compress_blocks_parallel(blocks, workers=2))
+    assert gzip.decompress(data) == b''.join(blocks)
+
+
+def test_compress_parallel_roundtrip():
+    compress = pytest.importorskip('banchan.compress')
+    rnd = random.Random(44)
+    for size in (0, 1, 1023, 1024, 1025, 50000):
+        data = bytes(bytearray(rnd.randrange(97, 101) for _ in range(size)))
+        result = compress.compress_parallel(data, block_size=1024, workers=3)
+        assert gzip.decompress(result) == data
+
+
+# Dispatch
+# --------
+
+def _sleeper(seconds, response):
+    def receiver(signal, sender, **named):
+        time.sleep(seconds)
+        return response
+    return receiver
+
+
+def test_send_robust_timeout_excludes_queueing():
+    dispatch = pytest.importorskip('banchan.dispatch')
+    signal = dispatch.Signal(max_workers=1, timeout=0.3)
+    receivers = [_sleeper(0.2, 'first'), _sleeper(0.2, 'second')]
+    for receiver in receivers:
+        signal.connect(receiver, weak=False)
+    try:
+        responses = signal.send_robust(sender=None)
+    finally:
+        signal.close()
+    assert responses == [(receivers[0], 'first'), (receivers[1], 'second')]
+
+
+def test_send_robust_timeout_per_receiver():
+    dispatch = pytest.importorskip('banchan.dispatch')
+    signal = dispatch.Signal(max_workers=1, timeout=0.1)
+    receivers = [_sleeper(0.5, 'slow'), _sleeper(0, 'queued')]
+    for receiver in receivers:
+        signal.connect(receiver, weak=False)
+    try:
+        responses = signal.send_robust(sender=None)
+    finally:
+        signal.close()
+    assert [receiver for receiver, _ in responses] == receivers
+    for _, response in responses:
+        assert isinstance(response, dispatch.ReceiverTimeoutError)
+
 
 if __name__ == '__main__':
     pytest.main()